@@ -0,0 +1,9 @@
+from asgiref.wsgi import WsgiToAsgi
+
+from run import app
+
+# ASGI entry point for servers such as uvicorn, e.g. `uvicorn asgi:application --workers 2`.
+# The Flask app runs in asgiref's single thread for sync code, outside the event loop, so each
+# process still serves one request at a time: concurrency comes from the number of workers,
+# as with the sync gunicorn workers.
+application = WsgiToAsgi(app)
@@ -0,0 +1,97 @@
+import os
+import sys
+
+# give access to the parent directory to run independently
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import text  # noqa: E402
+
+from dineinhall import create_app  # noqa: E402
+from dineinhall.database import connect  # noqa: E402
+from dineinhall.main.queries import SearchQuery  # noqa: E402
+from dineinhall.menus import MENU_ITEMS_QUERY  # noqa: E402
+from dineinhall.reviews.utils import WITH_DESCRIPTION, DATED, UNDATED, AFTER_DATED, review_query  # noqa: E402
+
+# Prints the EXPLAIN plans of the hot queries, as the app runs them, without and with the indexes
+# added in migrations 0003 and 0004. Those indexes are dropped and created again, nothing else in the
+# schema changes, but only run it on a scratch database.
+
+# the indexes of migrations 0003 and 0004 still in the schema, by name
+INDEXES = {
+    'ix_menu_date_location_meal': ('menu', 'menu_date, location, meal_type'),
+    'ix_food_on_menu_menu_food': ('food_on_menu', 'menu_id, food_id'),
+    'ix_rating_keyset': ('rating', 'timestamp, user_id, food_id'),
+    'ix_rating_food_keyset': ('rating', 'food_id, timestamp, user_id'),
+    'ix_rating_user_keyset': ('rating', 'user_id, timestamp, food_id'),
+}
+
+# the second page of the reviews starts after a cursor
+CURSOR = {'timestamp': '2019-09-03 12:00:00', 'user_id': 1, 'food_id': 1}
+
+QUERIES = {
+    'menu page': (MENU_ITEMS_QUERY, {'curdate': '2019-09-03', 'loc': 'IV'}),
+    'all reviews': (review_query([WITH_DESCRIPTION, DATED]), {'limit': 21}),
+    'all reviews, next page': (review_query([WITH_DESCRIPTION, DATED, AFTER_DATED]), dict(CURSOR, limit=21)),
+    'all reviews, undated': (review_query([WITH_DESCRIPTION, UNDATED]), {'limit': 21}),
+    'food reviews': (review_query([WITH_DESCRIPTION, 'rating.food_id = :review_food_id', DATED]),
+                     {'review_food_id': 1, 'limit': 21}),
+    'user reviews': (review_query([WITH_DESCRIPTION, 'user.user_name = :user_name', DATED]),
+                     {'user_name': 'demo', 'limit': 21}),
+}
+
+# a full-text search with one more filter, as the Advanced Search page sends it
+SEARCH = SearchQuery(menu_date='2019-09-03', meal='lunch', locations=['IV', 'Steast'], food_name='chicken',
+                     max_calories=600)
+
+
+# the search statement is built by SQLAlchemy, so it is compiled the way the app sends it to the driver
+def searchQuery(con):
+    compiled = SEARCH.statement().params(**SEARCH.params()).compile(
+        dialect=con.dialect, compile_kwargs={'render_postcompile': True})
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    return compiled.string, params
+
+
+def explainAll():
+    plans = {}
+    with connect() as con:
+        for name, (query, params) in QUERIES.items():
+            rs = con.execute(text(f'explain {query}'), params)
+            plans[name] = [dict(row) for row in rs]
+        query, params = searchQuery(con)
+        plans['advanced search'] = [dict(row) for row in con.exec_driver_sql(f'explain {query}', params)]
+    return plans
+
+
+def dropIndexes():
+    with connect() as con:
+        for name, (table, _) in INDEXES.items():
+            con.execute(text(f'drop index {name} on {table}'))
+
+
+def createIndexes():
+    with connect() as con:
+        for name, (table, columns) in INDEXES.items():
+            con.execute(text(f'create index {name} on {table} ({columns})'))
+
+
+def printPlans(label, plans):
+    print(f'==== {label}')
+    for name, rows in plans.items():
+        print(f'-- {name}')
+        for row in rows:
+            print(f"  {row['table']:<18} type={row['type']:<8} key={str(row['key']):<28} "
+                  f"rows={row['rows']:<8} extra={row['Extra']}")
+
+
+if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+        dropIndexes()
+        try:
+            printPlans('before indexes', explainAll())
+        finally:
+            createIndexes()
+        printPlans('after indexes', explainAll())
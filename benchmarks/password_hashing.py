@@ -0,0 +1,71 @@
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+# give access to the parent directory to run independently
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dineinhall.passwords import PasswordHasher, hash_password  # noqa: E402
+
+# Measures login throughput (password checks per second) and latency at several bcrypt
+# cost factors, with `concurrency` simultaneous logins sharing a pool of `workers` processes,
+# as one web worker would. No database is needed.
+
+PASSWORD = 'correct horse battery staple'
+
+
+def run(rounds, workers, concurrency, logins):
+    hasher = PasswordHasher()
+    hasher.configure(rounds, workers, max_pending=concurrency, timeout=600)
+    pw_hash = hash_password(PASSWORD, rounds)
+    # start the pool before timing
+    hasher.check(pw_hash, PASSWORD)
+
+    latencies = []
+    lock = threading.Lock()
+
+    def client(count):
+        for _ in range(count):
+            start = time.perf_counter()
+            hasher.check(pw_hash, PASSWORD)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    counts = [logins // concurrency + (1 if index < logins % concurrency else 0) for index in range(concurrency)]
+    threads = [threading.Thread(target=client, args=(count,)) for count in counts]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if hasher.executor is not None:
+        hasher.executor.shutdown()
+
+    latencies.sort()
+    return {
+        'logins_per_sec': logins / elapsed,
+        'median_ms': statistics.median(latencies) * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Login throughput at different bcrypt cost factors.')
+    parser.add_argument('--rounds', type=int, nargs='+', default=[10, 11, 12, 13])
+    parser.add_argument('--workers', type=int, default=1, help='hashing processes, 0 hashes in the calling threads')
+    parser.add_argument('--concurrency', type=int, default=8, help='simultaneous logins')
+    parser.add_argument('--logins', type=int, default=64, help='logins per cost factor')
+    args = parser.parse_args()
+
+    print(f"{'rounds':<8}{'logins/s':>12}{'median ms':>12}{'p95 ms':>12}")
+    for rounds in args.rounds:
+        result = run(rounds, args.workers, args.concurrency, args.logins)
+        print(f"{rounds:<8}{result['logins_per_sec']:>12.1f}{result['median_ms']:>12.1f}{result['p95_ms']:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Measures how long a fresh process takes to import the app, run create_app and serve its
+# first request, with and without templates precompiled. Each run is a new interpreter so
+# nothing is already imported. The first request goes to the login page which needs no database.
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+STAGES = ('import_ms', 'create_app_ms', 'first_request_ms', 'second_request_ms')
+
+
+# runs inside the child process and prints the timings of each stage as json
+def measure(path):
+    start = time.perf_counter()
+    from dineinhall import create_app
+    imported = time.perf_counter()
+    app = create_app()
+    created = time.perf_counter()
+    client = app.test_client()
+    client.get(path)
+    first = time.perf_counter()
+    client.get(path)
+    second = time.perf_counter()
+    print(json.dumps({
+        'import_ms': (imported - start) * 1000,
+        'create_app_ms': (created - imported) * 1000,
+        'first_request_ms': (first - created) * 1000,
+        'second_request_ms': (second - first) * 1000,
+    }))
+
+
+def run(path, runs, precompile):
+    env = dict(os.environ, PRECOMPILE_TEMPLATES='true' if precompile else 'false')
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', '--path', path],
+                                cwd=ROOT, env=env, check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return {stage: statistics.median(result[stage] for result in results) for stage in STAGES}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time app import, create_app and the first request.')
+    parser.add_argument('--runs', type=int, default=5, help='fresh processes per setting, the median is shown')
+    parser.add_argument('--path', default='/login', help='page requested after startup')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, ROOT)
+        measure(args.path)
+        return
+
+    print(f"{'templates':<12}" + ''.join(f'{stage:>20}' for stage in STAGES))
+    for precompile in (False, True):
+        medians = run(args.path, args.runs, precompile)
+        label = 'precompiled' if precompile else 'lazy'
+        print(f'{label:<12}' + ''.join(f'{medians[stage]:>20.1f}' for stage in STAGES))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+import argparse
+import http.client
+import os
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlencode
+
+# Compares requests per second of the read heavy pages between the sync gunicorn workers,
+# gevent workers and the ASGI entry point, all with the same number of worker processes.
+# Needs a database with menus and reviews, and gevent/uvicorn installed for those modes.
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+# public pages only, anything but a 200 counts as an error
+PATHS = ['/menu/IV', '/reviews/-1']
+# the Advanced Search form posted by every client along with the paths, it is what runs the search query
+SEARCH_PATH = '/AdvancedSearch'
+SEARCH_FORM = {'meal': 'lunch', 'iv': 'y', 'steast': 'y', 'foodName': 'chicken', 'submit': 'Search'}
+CSRF_TOKEN = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+
+
+def server_command(mode, workers, address):
+    if mode == 'asgi':
+        host, port = address.split(':')
+        return ['uvicorn', 'asgi:application', '--host', host, '--port', port, '--workers', str(workers)]
+    return ['gunicorn', '-c', 'gunicorn.conf.py', '-b', address, '-w', str(workers), 'run:app']
+
+
+# gunicorn.conf.py picks the worker class from the environment, and only monkey patches for gevent then
+def server_env(mode):
+    env = dict(os.environ)
+    if mode != 'asgi':
+        env['GUNICORN_WORKER_CLASS'] = mode
+    return env
+
+
+# the session cookie and CSRF token a browser would post the search form with
+def search_session(con):
+    con.request('GET', SEARCH_PATH)
+    response = con.getresponse()
+    page = response.read().decode('utf-8')
+    token = CSRF_TOKEN.search(page)
+    if response.status != 200 or token is None:
+        raise RuntimeError(f'could not read the search form from {SEARCH_PATH}')
+    cookie = response.getheader('Set-Cookie', '').split(';')[0]
+    body = urlencode(dict(SEARCH_FORM, csrf_token=token.group(1)))
+    return {'Cookie': cookie, 'Content-Type': 'application/x-www-form-urlencoded'}, body
+
+
+def wait_for_port(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server did not start on {host}:{port}')
+
+
+# keeps `concurrency` keep-alive clients busy for `duration` seconds and counts the responses,
+# each client cycles through the paths and a search
+def load(host, port, paths, concurrency, duration):
+    counts = [0] * concurrency
+    errors = [0] * concurrency
+    deadline = time.monotonic() + duration
+
+    def client(index):
+        con = http.client.HTTPConnection(host, port, timeout=30)
+        headers, body = search_session(con)
+        request = 0
+        while time.monotonic() < deadline:
+            try:
+                if request % (len(paths) + 1) == len(paths):
+                    con.request('POST', SEARCH_PATH, body=body, headers=headers)
+                else:
+                    con.request('GET', paths[request % (len(paths) + 1)])
+                response = con.getresponse()
+                response.read()
+                if response.status == 200:
+                    counts[index] += 1
+                else:
+                    errors[index] += 1
+            except (OSError, http.client.HTTPException):
+                errors[index] += 1
+                con.close()
+                con = http.client.HTTPConnection(host, port, timeout=30)
+            request += 1
+        con.close()
+
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / duration, sum(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Requests per second of the sync, gevent and ASGI setups.')
+    parser.add_argument('--modes', nargs='+', default=['sync', 'gevent', 'asgi'], choices=['sync', 'gevent', 'asgi'])
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='worker processes, the same for every mode')
+    parser.add_argument('--concurrency', type=int, default=50, help='simultaneous clients')
+    parser.add_argument('--duration', type=float, default=20, help='seconds of load per mode')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--paths', nargs='+', default=PATHS)
+    args = parser.parse_args()
+
+    host = '127.0.0.1'
+    print(f"{'mode':<8}{'workers':>10}{'req/s':>12}{'errors':>10}")
+    for mode in args.modes:
+        server = subprocess.Popen(server_command(mode, args.workers, f'{host}:{args.port}'), cwd=ROOT,
+                                  env=server_env(mode), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_for_port(host, args.port)
+            # one short warm up so every worker has compiled templates and opened connections
+            load(host, args.port, args.paths, args.concurrency, 2)
+            rate, errors = load(host, args.port, args.paths, args.concurrency, args.duration)
+            print(f'{mode:<8}{args.workers:>10}{rate:>12.1f}{errors:>10}')
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,32 +1,60 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from flask_bcrypt import Bcrypt
 from flask_login import LoginManager
 from flask_mail import Mail
+from flask_migrate import Migrate
+from dineinhall.cache import MenuCache, UserCache
 from dineinhall.config import Config
+from dineinhall.http_caching import StaticFingerprints
+from dineinhall.images import PicturePipeline
+from dineinhall.mailer import MailQueue
+from dineinhall.passwords import PasswordHasher
 
 db = SQLAlchemy()
-bcrypt = Bcrypt()
+password_hasher = PasswordHasher()
 login_manager = LoginManager()
 login_manager.login_view = 'users.login'
 login_manager.login_message_category = 'info'
 mail = Mail()
+migrate = Migrate()
+menu_cache = MenuCache()
+user_cache = UserCache()
+mail_queue = MailQueue()
+picture_pipeline = PicturePipeline()
+static_fingerprints = StaticFingerprints()
 
 
 def create_app(config_class=Config):
     app = Flask(__name__)
-    app.config.from_object(Config)
+    app.config.from_object(config_class)
 
     db.init_app(app)
-    bcrypt.init_app(app)
+    password_hasher.init_app(app)
     login_manager.init_app(app)
     mail.init_app(app)
+    migrate.init_app(app, db)
+    menu_cache.init_app(app)
+    user_cache.init_app(app)
+    mail_queue.init_app(app)
+    picture_pipeline.init_app(app)
+    static_fingerprints.init_app(app)
 
     from dineinhall.users.routes import users
     from dineinhall.main.routes import main
     from dineinhall.reviews.routes import review
+    from dineinhall.api.routes import api
     app.register_blueprint(users)
     app.register_blueprint(main)
     app.register_blueprint(review)
+    app.register_blueprint(api)
+
+    if app.config['PRECOMPILE_TEMPLATES']:
+        precompile_templates(app)
 
     return app
+
+
+# compiles every template up front so the first request of each worker does not pay for it
+def precompile_templates(app):
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
@@ -0,0 +1,129 @@
+from datetime import datetime
+from flask import Blueprint, request
+from pytz import timezone, utc
+from werkzeug.exceptions import BadRequest, HTTPException
+
+from .utils import api_response, api_error, selected_fields, select_fields, negotiate_encoding
+from dineinhall.catalog import MenuItem
+from dineinhall.database import connect
+from dineinhall.http_caching import page_etag, not_modified, with_validators
+from dineinhall.main.queries import SearchQuery, SEARCH_COLUMNS
+from dineinhall.menus import get_menu_foods, get_menu_version
+from dineinhall.models import FoodRatingStats
+
+# read only JSON versions of the menu, advanced search and rating pages, for kiosks and mobile clients
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+LOCATIONS = ['IV', 'Steast', 'Stwest']
+MEALS = ['breakfast', 'lunch', 'dinner']
+MENU_FIELDS = list(MenuItem._fields)
+SEARCH_FIELDS = [column.name for column in SEARCH_COLUMNS]
+RATING_FIELDS = ['food_id', 'rating_count', 'average', 'histogram']
+
+
+# registered on the app so that urls no API route matches and uncaught exceptions (500s) under /api/
+# get JSON errors as well, the other pages keep the default error pages
+@api.app_errorhandler(HTTPException)
+def handleError(error):
+    if request.path == api.url_prefix or request.path.startswith(api.url_prefix + '/'):
+        return api_error(error)
+    return error
+
+
+# the ?date= argument, today in EST when it is not given
+def requestedDate():
+    value = request.args.get('date')
+    if not value:
+        return datetime.now(timezone('US/Eastern')).strftime("%Y-%m-%d")
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        raise BadRequest('date must be formatted as YYYY-MM-DD')
+
+
+def requestedChoice(name, choices):
+    value = request.args.get(name)
+    if value is not None and value not in choices:
+        raise BadRequest(f"{name} must be one of {', '.join(choices)}")
+    return value
+
+
+def requestedNumber(name, kind=int, low=0, high=None):
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        number = kind(value)
+    except ValueError:
+        raise BadRequest(f'{name} must be a number')
+    if number < low or (high is not None and number > high):
+        raise BadRequest(f'{name} is out of range')
+    return number
+
+
+def requestedFlag(name):
+    return request.args.get(name, '').lower() in ('1', 'true', 'yes')
+
+
+# the foods on the menu of a location for a day, optionally only one meal
+@api.route("/menus/<loc>")
+def menu(loc):
+    if loc not in LOCATIONS:
+        raise BadRequest(f"location must be one of {', '.join(LOCATIONS)}")
+    curdate = requestedDate()
+    meal = requestedChoice('meal', MEALS)
+    fields = selected_fields(MENU_FIELDS)
+
+    # clients polling an unchanged menu get a 304 without the menu being read
+    version = get_menu_version(loc, curdate)
+    last_modified = utc.localize(version) if version is not None else None
+    etag = page_etag('api-menu', loc, curdate, version, meal, ','.join(fields), negotiate_encoding())
+    response = not_modified(etag, last_modified)
+    if response is not None:
+        return response
+
+    foods = [food for food in get_menu_foods(loc, curdate, version) if meal is None or food.meal_type == meal]
+    data = {'location': loc, 'date': curdate, 'meal': meal, 'items': select_fields(foods, fields)}
+    return with_validators(api_response(data), etag, last_modified)
+
+
+# the Advanced Search filters as query arguments, e.g. /search?meal=lunch&locations=IV,Steast&vegan=1
+@api.route("/search")
+def search():
+    locations = request.args.get('locations')
+    locations = locations.split(',') if locations else LOCATIONS
+    for loc in locations:
+        if loc not in LOCATIONS:
+            raise BadRequest(f"locations must be among {', '.join(LOCATIONS)}")
+    meal = requestedChoice('meal', MEALS)
+    if meal is None:
+        raise BadRequest('meal is required')
+    fields = selected_fields(SEARCH_FIELDS)
+    query = SearchQuery(menu_date=requestedDate(),
+                        meal=meal,
+                        locations=locations,
+                        food_name=request.args.get('q', ''),
+                        max_calories=requestedNumber('max_calories'),
+                        max_fat=requestedNumber('max_fat'),
+                        max_carbs=requestedNumber('max_carbs'),
+                        min_protein=requestedNumber('min_protein'),
+                        min_rating=requestedNumber('min_rating', kind=float, low=1, high=5),
+                        vegetarian=requestedFlag('vegetarian'),
+                        vegan=requestedFlag('vegan'),
+                        balanced=requestedFlag('balanced'))
+    with connect() as con:
+        foods = select_fields(query.execute(con), fields)
+    return api_response({'items': foods})
+
+
+# rating aggregates of one food
+@api.route("/ratings/<int:food_id>")
+def ratings(food_id):
+    fields = selected_fields(RATING_FIELDS)
+    stats = FoodRatingStats.query.get(food_id)
+    if stats is None:
+        data = {'food_id': food_id, 'rating_count': 0, 'average': None, 'histogram': [0, 0, 0, 0, 0]}
+    else:
+        data = {'food_id': food_id, 'rating_count': stats.rating_count, 'average': stats.average,
+                'histogram': stats.histogram()}
+    return api_response(select_fields([data], fields)[0])
@@ -0,0 +1,91 @@
+import gzip
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import current_app, request, jsonify
+from werkzeug.exceptions import BadRequest
+
+# both are optional, without them the standard library json encoder and gzip are used
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# This file turns API results into compact, compressed JSON responses.
+# Clients pick the fields they need with ?fields=a,b,c and get the body in the
+# best encoding they accept (brotli when installed, then gzip).
+
+# bodies smaller than this are sent as they are, compressing them saves next to nothing
+MIN_COMPRESS_SIZE = 512
+
+
+def json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data, default=json_default)
+    return json.dumps(data, default=json_default, separators=(',', ':')).encode('utf-8')
+
+
+# the fields asked for with ?fields=, all of them when it is not given
+def selected_fields(available):
+    fields = request.args.get('fields')
+    if not fields:
+        return list(available)
+    fields = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in available]
+    if unknown:
+        raise BadRequest(f"Unknown fields: {', '.join(unknown)}. Available fields: {', '.join(available)}")
+    return fields
+
+
+# keeps the selected fields of each row, rows are mappings or named tuples
+def select_fields(rows, fields):
+    rows = [row._asdict() if hasattr(row, '_asdict') else row for row in rows]
+    return [{field: row[field] for field in fields} for row in rows]
+
+
+# the best encoding the client accepts among the ones available here
+def negotiate_encoding():
+    offered = (['br'] if brotli is not None else []) + ['gzip']
+    return request.accept_encodings.best_match(offered)
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=current_app.config['API_BROTLI_QUALITY'])
+    return gzip.compress(body, compresslevel=current_app.config['API_GZIP_LEVEL'])
+
+
+# a json response with the body compressed when the client accepts it
+def api_response(data, status=200):
+    body = dumps(data)
+    response = current_app.response_class(body, status=status, mimetype='application/json')
+    encoding = negotiate_encoding() if len(body) >= MIN_COMPRESS_SIZE else None
+    if encoding:
+        response.set_data(compress(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+# keeps the headers the exception would have sent, like Allow on a 405 or Retry-After on a 503
+def api_error(error):
+    response = jsonify(error=error.name, message=error.description)
+    response.status_code = error.code
+    for name, value in error.get_response().headers.items():
+        if name not in ('Content-Type', 'Content-Length'):
+            response.headers.add(name, value)
+    return response
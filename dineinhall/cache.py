@@ -0,0 +1,146 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+# This file holds the cache backends used to keep database results in memory
+# between requests. Values must be JSON serializable so either backend works.
+
+# in-process cache with a time to live and least recently used eviction
+class MemoryCache():
+    def __init__(self, max_entries=256, ttl=600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            # mark as most recently used
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        with self.lock:
+            self.entries[key] = (expires, value)
+            self.entries.move_to_end(key)
+            # evict the least recently used entries once over capacity
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        with self.lock:
+            for key in [key for key in self.entries if key.startswith(prefix)]:
+                del self.entries[key]
+
+
+# cache shared between processes through a Redis compatible server
+class RedisCache():
+    def __init__(self, url, ttl=600):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def get(self, key):
+        value = self.client.get(key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, json.dumps(value, default=str), ex=ttl if ttl is not None else self.ttl)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def delete_prefix(self, prefix):
+        keys = list(self.client.scan_iter(match=f'{prefix}*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+# cache of the foods on each menu keyed by (location, date, meal type)
+class MenuCache():
+    def __init__(self, app=None):
+        self.backend = None
+        self.version_ttl = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        ttl = app.config['MENU_CACHE_TTL']
+        if app.config['MENU_CACHE_BACKEND'] == 'redis':
+            self.backend = RedisCache(app.config['MENU_CACHE_URL'], ttl=ttl)
+            # the scraper's invalidation reaches every worker, versions are kept as long as the menus
+            self.version_ttl = None
+        else:
+            self.backend = MemoryCache(max_entries=app.config['MENU_CACHE_MAX_ENTRIES'], ttl=ttl)
+            # nothing outside this process clears it, so versions are read again after a short while
+            self.version_ttl = app.config['MENU_VERSION_TTL']
+
+    @staticmethod
+    def key(location, date, meal_type='all'):
+        return f'menu:{date}:{location}:{meal_type}'
+
+    def get(self, location, date, meal_type='all'):
+        if self.backend is None:
+            return None
+        return self.backend.get(self.key(location, date, meal_type))
+
+    def set(self, location, date, rows, meal_type='all', ttl=None):
+        if self.backend is not None:
+            self.backend.set(self.key(location, date, meal_type), rows, ttl=ttl)
+
+    # drops every cached menu, or only the menus for the given date
+    def invalidate(self, date=None):
+        if self.backend is not None:
+            self.backend.delete_prefix(f'menu:{date}:' if date is not None else 'menu:')
+
+
+# cache of the logged in users loaded on every request keyed by user_id
+# only the columns shown on pages are kept, never the password hash
+class UserCache():
+    COLUMNS = ('user_id', 'user_name', 'email', 'profile_pic')
+
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    # with the memory backend invalidate only reaches the current process, the others keep the old
+    # display columns until they expire, which never matters for security since the password is not cached
+    def init_app(self, app):
+        ttl = app.config['USER_CACHE_TTL']
+        if app.config['USER_CACHE_BACKEND'] == 'redis':
+            self.backend = RedisCache(app.config['MENU_CACHE_URL'], ttl=ttl)
+        else:
+            self.backend = MemoryCache(max_entries=app.config['USER_CACHE_MAX_ENTRIES'], ttl=ttl)
+
+    @staticmethod
+    def key(user_id):
+        return f'user:{user_id}'
+
+    def get(self, user_id):
+        if self.backend is None:
+            return None
+        return self.backend.get(self.key(user_id))
+
+    def set(self, user):
+        if self.backend is not None:
+            self.backend.set(self.key(user.user_id), {column: getattr(user, column) for column in self.COLUMNS})
+
+    # called after a user's row changes so the next request loads it again
+    def invalidate(self, user_id):
+        if self.backend is not None:
+            self.backend.delete(self.key(user_id))
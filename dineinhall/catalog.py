@@ -0,0 +1,44 @@
+import sys
+from collections import namedtuple
+
+
+# This file holds the compact records used for foods and menus outside of the ORM,
+# by the scraper while it ingests menus and by the web side while it serves them.
+
+# numeric nutrient columns of the food table
+NUTRIENT_FIELDS = ('calories', 'calories_from_fat', 'cholesterol', 'dietary_fiber', 'protein',
+                   'saturated_fat', 'sodium', 'sugar', 'total_carbs', 'total_fat', 'trans_fat', 'vitamin_d')
+
+# every column of the food table in insert order
+FOOD_COLUMNS = ('food_id', 'food_name', 'serving') + NUTRIENT_FIELDS + ('vegetarian', 'vegan', 'balanced', 'description')
+
+
+# a row of the food table, slots keep each record free of a per instance dict
+class FoodRecord():
+    __slots__ = FOOD_COLUMNS
+
+    def __init__(self, **fields):
+        for column in FOOD_COLUMNS:
+            setattr(self, column, fields.get(column))
+        # the same food name shows up on many menus so only one copy is kept
+        if self.food_name is not None:
+            self.food_name = sys.intern(self.food_name)
+
+    def as_dict(self):
+        return {column: getattr(self, column) for column in FOOD_COLUMNS}
+
+    def __repr__(self):
+        return f"FoodRecord({self.food_id}, '{self.food_name}')"
+
+
+# a food on a menu with the columns shown on the menu page, stored as a plain tuple
+MenuItem = namedtuple('MenuItem', ['food_id', 'food_name', 'meal_type', 'serving', 'calories',
+                                   'protein', 'total_carbs', 'total_fat'])
+
+
+def menu_item_from_row(row):
+    food_name = row['food_name']
+    if food_name is not None:
+        food_name = sys.intern(food_name)
+    return MenuItem(row['food_id'], food_name, row['meal_type'], row['serving'],
+                    row['calories'], row['protein'], row['total_carbs'], row['total_fat'])
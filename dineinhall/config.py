@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -7,8 +8,85 @@ load_dotenv()
 class Config:
     SECRET_KEY = os.environ["SECRET_KEY"]
     SQLALCHEMY_DATABASE_URI = os.environ["SQLALCHEMY_DATABASE_URI"]
-    MAIL_SERVER = 'smtp.googlemail.com'
-    MAIL_PORT = 587
-    MAIL_USE_TLS = True
+    # connection pool shared by every blueprint and the scraper
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 5))
+    DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", 10))
+    # recycle connections before MySQL's wait_timeout closes them on the server side
+    DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 280))
+    DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true"
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_POOL_PRE_PING,
+    }
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # exposes /status/pool so workers can be sized against the database
+    POOL_STATUS_ENABLED = os.environ.get("POOL_STATUS_ENABLED", "false").lower() == "true"
+    # cache of menu rows, "memory" keeps them per process and "redis" (needs the redis package) shares them
+    MENU_CACHE_BACKEND = os.environ.get("MENU_CACHE_BACKEND", "memory")
+    MENU_CACHE_URL = os.environ.get("MENU_CACHE_URL", "redis://localhost:6379/0")
+    MENU_CACHE_TTL = int(os.environ.get("MENU_CACHE_TTL", 600))
+    MENU_CACHE_MAX_ENTRIES = int(os.environ.get("MENU_CACHE_MAX_ENTRIES", 256))
+    # seconds a "memory" cache trusts the menu versions it read, the scraper cannot invalidate it from another process
+    MENU_VERSION_TTL = int(os.environ.get("MENU_VERSION_TTL", 30))
+    # logged in users are cached for a short time so pages do not load them from the database on every request,
+    # with "memory" other workers may show an old name, email or picture for up to USER_CACHE_TTL seconds
+    USER_CACHE_BACKEND = os.environ.get("USER_CACHE_BACKEND", MENU_CACHE_BACKEND)
+    USER_CACHE_TTL = int(os.environ.get("USER_CACHE_TTL", 60))
+    USER_CACHE_MAX_ENTRIES = int(os.environ.get("USER_CACHE_MAX_ENTRIES", 1024))
+    # bcrypt cost factor, existing hashes are upgraded or downgraded when their users log in
+    BCRYPT_LOG_ROUNDS = int(os.environ.get("BCRYPT_LOG_ROUNDS", 12))
+    # processes per web worker that hash passwords, 0 hashes in the request thread
+    PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", 1))
+    # logins waiting on the pool beyond this get a 503 after PASSWORD_HASH_TIMEOUT seconds
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get("PASSWORD_HASH_MAX_PENDING", 8))
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get("PASSWORD_HASH_TIMEOUT", 2))
+    # passwords hashed at once by all the web workers of a host, keep it below WEB_CONCURRENCY,
+    # through lock files in PASSWORD_HASH_LOCK_DIR
+    PASSWORD_HASH_SLOTS = int(os.environ.get("PASSWORD_HASH_SLOTS", 1))
+    PASSWORD_HASH_LOCK_DIR = os.environ.get("PASSWORD_HASH_LOCK_DIR",
+                                            os.path.join(tempfile.gettempdir(), "dineinhall-password-slots"))
+    # the hashing processes yield the CPU to the web workers when both are busy
+    PASSWORD_HASH_NICE = int(os.environ.get("PASSWORD_HASH_NICE", 10))
+    # compression of JSON API responses, brotli is used when the package is installed and the client accepts it
+    API_GZIP_LEVEL = int(os.environ.get("API_GZIP_LEVEL", 6))
+    API_BROTLI_QUALITY = int(os.environ.get("API_BROTLI_QUALITY", 5))
+    # days of menu snapshots kept for the menu pages, older days are read from the menu tables
+    MENU_SNAPSHOT_RETENTION_DAYS = int(os.environ.get("MENU_SNAPSHOT_RETENTION_DAYS", 30))
+    # number of reviews shown per page
+    REVIEWS_PAGE_SIZE = int(os.environ.get("REVIEWS_PAGE_SIZE", 20))
+    # dineoncampus API used by the scraper, point SCRAPER_API_URL at a local server to replay responses
+    SCRAPER_API_URL = os.environ.get("SCRAPER_API_URL", "https://api.dineoncampus.com/v1/location/menu")
+    SCRAPER_SITE_ID = os.environ.get("SCRAPER_SITE_ID", "5751fd2b90975b60e048929a")
+    SCRAPER_CONCURRENCY = int(os.environ.get("SCRAPER_CONCURRENCY", 6))
+    SCRAPER_TIMEOUT = int(os.environ.get("SCRAPER_TIMEOUT", 15))
+    SCRAPER_RETRIES = int(os.environ.get("SCRAPER_RETRIES", 3))
+    SCRAPER_BACKOFF = float(os.environ.get("SCRAPER_BACKOFF", 0.5))
+    SCRAPER_BATCH_SIZE = int(os.environ.get("SCRAPER_BATCH_SIZE", 500))
+    # API responses are kept here so unchanged days are skipped, offline mode only replays them
+    SCRAPER_CACHE_DIR = os.environ.get("SCRAPER_CACHE_DIR", os.path.join(os.path.dirname(__file__), '..', 'scraping', 'cache'))
+    SCRAPER_OFFLINE = os.environ.get("SCRAPER_OFFLINE", "false").lower() == "true"
+    # compile every template in create_app, the gunicorn config turns it on so workers inherit them
+    PRECOMPILE_TEMPLATES = os.environ.get("PRECOMPILE_TEMPLATES", "false").lower() == "true"
+    # uploaded profile pictures, processed into each size (in pixels) by PROFILE_PIC_WORKERS threads per process
+    PROFILE_PIC_DIR = os.environ.get("PROFILE_PIC_DIR", os.path.join(os.path.dirname(__file__), 'static', 'profile_pics'))
+    PROFILE_PIC_SIZES = tuple(int(size) for size in os.environ.get("PROFILE_PIC_SIZES", "64,125,250").split(","))
+    PROFILE_PIC_WORKERS = int(os.environ.get("PROFILE_PIC_WORKERS", 2))
+    # point MAIL_SERVER at a local SMTP server (e.g. aiosmtpd on port 8025 without TLS) to test delivery
+    MAIL_SERVER = os.environ.get("MAIL_SERVER", "smtp.googlemail.com")
+    MAIL_PORT = int(os.environ.get("MAIL_PORT", 587))
+    MAIL_USE_TLS = os.environ.get("MAIL_USE_TLS", "true").lower() == "true"
     MAIL_USERNAME = os.environ["email_username"]
     MAIL_PASSWORD = os.environ["email_password"]
+    # emails are sent by background workers, each with one SMTP connection closed after MAIL_IDLE_TIMEOUT seconds
+    MAIL_QUEUE_ENABLED = os.environ.get("MAIL_QUEUE_ENABLED", "true").lower() == "true"
+    MAIL_QUEUE_WORKERS = int(os.environ.get("MAIL_QUEUE_WORKERS", 1))
+    MAIL_BATCH_SIZE = int(os.environ.get("MAIL_BATCH_SIZE", 20))
+    MAIL_RETRIES = int(os.environ.get("MAIL_RETRIES", 3))
+    MAIL_BACKOFF = float(os.environ.get("MAIL_BACKOFF", 1.0))
+    MAIL_IDLE_TIMEOUT = float(os.environ.get("MAIL_IDLE_TIMEOUT", 30))
+    # messages that still fail after every retry are appended here as json lines
+    MAIL_DEAD_LETTER_PATH = os.environ.get("MAIL_DEAD_LETTER_PATH", os.path.join(os.path.dirname(__file__), '..', 'mail_dead_letter.jsonl'))
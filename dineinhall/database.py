@@ -0,0 +1,100 @@
+import threading
+import time
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+
+from dineinhall import db
+
+
+# This file gives every blueprint and the scraper a single pooled engine
+# (the Flask-SQLAlchemy one) and keeps track of how busy its pool is.
+
+class PoolStats():
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    # records how long a caller waited to get a connection from the pool
+    def record_wait(self, seconds):
+        with self.lock:
+            self.checkouts += 1
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+
+    def on_checkout(self):
+        with self.lock:
+            self.checked_out += 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+
+    def on_checkin(self):
+        with self.lock:
+            self.checked_out = max(self.checked_out - 1, 0)
+
+    # summary of pool usage, saturation is the share of all possible connections in use
+    def snapshot(self, engine):
+        pool = engine.pool
+        capacity = pool.size() + max(getattr(pool, '_max_overflow', 0), 0)
+        with self.lock:
+            avg_wait = self.total_wait / self.checkouts if self.checkouts else 0.0
+            return {
+                'pool_size': pool.size(),
+                'capacity': capacity,
+                'checked_out': pool.checkedout(),
+                'overflow': pool.overflow(),
+                'peak_checked_out': self.peak_checked_out,
+                'saturation': round(pool.checkedout() / capacity, 3) if capacity else 0.0,
+                'peak_saturation': round(self.peak_checked_out / capacity, 3) if capacity else 0.0,
+                'checkouts': self.checkouts,
+                'avg_checkout_ms': round(avg_wait * 1000, 3),
+                'max_checkout_ms': round(self.max_wait * 1000, 3),
+            }
+
+
+pool_stats = PoolStats()
+
+
+@event.listens_for(Pool, 'checkout')
+def _on_checkout(dbapi_con, con_record, con_proxy):
+    pool_stats.on_checkout()
+
+
+@event.listens_for(Pool, 'checkin')
+def _on_checkin(dbapi_con, con_record):
+    pool_stats.on_checkin()
+
+
+# the engine configured in create_app, must be called inside an app context
+def get_engine():
+    return db.engine
+
+
+# checks out a connection from the shared pool and times the wait
+def connect():
+    start = time.perf_counter()
+    con = get_engine().connect()
+    pool_stats.record_wait(time.perf_counter() - start)
+    return con
+
+
+# checks out a connection with a transaction which commits when the block exits, engine.begin()
+# only checks out when the block is entered so the connection is taken here to time the wait
+@contextmanager
+def begin():
+    with connect() as con, con.begin():
+        yield con
+
+
+# drops the pooled connections inherited from a parent process without closing them,
+# so a forked worker opens its own connections instead of sharing the parent's sockets
+def dispose_engine(app):
+    with app.app_context():
+        get_engine().dispose(close=False)
+
+
+def get_pool_status():
+    return pool_stats.snapshot(get_engine())
@@ -0,0 +1,98 @@
+import hashlib
+import os
+
+from flask import current_app, request, session
+from flask_login import current_user
+from werkzeug.utils import safe_join
+
+
+# This file lets pages answer conditional GETs and lets browsers keep static files.
+# Pages get an ETag made from the version of the data they show, so a browser that already
+# has the current page gets a 304 without the template being rendered. Static urls carry a
+# hash of the file so they can be cached for a year and still change when the file does.
+
+STATIC_MAX_AGE = 365 * 24 * 60 * 60
+
+
+# a validator for a page from the version of its data, the release of the code and who is looking at it
+def page_etag(*parts):
+    key = ':'.join(str(part) for part in (current_app.config['RELEASE'],) + parts + (current_user.get_id(),))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def with_validators(response, etag, last_modified=None):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # browsers and proxies may keep the page but must check it is still current before using it
+    response.cache_control.no_cache = True
+    if current_user.is_authenticated:
+        response.cache_control.private = True
+    else:
+        response.cache_control.public = True
+    response.vary.add('Cookie')
+    return response
+
+
+# a 304 response when the client already has the page with this etag, otherwise None
+def not_modified(etag, last_modified=None):
+    # messages flashed by an earlier request are part of the page, so it has to be rendered to show them
+    if session.get('_flashes') or not request.if_none_match.contains(etag):
+        return None
+    return with_validators(current_app.response_class(status=304), etag, last_modified)
+
+
+class StaticFingerprints():
+    def __init__(self, app=None):
+        self.hashes = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.folder = app.static_folder
+        app.url_defaults(self.add_fingerprint)
+        app.after_request(self.cache_fingerprinted)
+        # templates and static files change the pages, so a new release invalidates every page etag
+        app.config.setdefault('RELEASE', self.release(os.path.join(app.root_path, app.template_folder)))
+
+    # hash of every template and every top level static file
+    def release(self, template_folder):
+        digest = hashlib.sha1()
+        for root, _, names in sorted(os.walk(template_folder)):
+            for name in sorted(names):
+                with open(os.path.join(root, name), 'rb') as f:
+                    digest.update(f.read())
+        for name in sorted(os.listdir(self.folder)):
+            if os.path.isfile(os.path.join(self.folder, name)):
+                digest.update(self.fingerprint(name).encode('utf-8'))
+        return digest.hexdigest()[:12]
+
+    # content hash of a static file, recomputed only when the file changes on disk
+    def fingerprint(self, filename):
+        path = safe_join(self.folder, filename)
+        try:
+            stat = os.stat(path)
+        except (OSError, TypeError):
+            return None
+        key = (filename, stat.st_mtime_ns, stat.st_size)
+        fingerprint = self.hashes.get(key)
+        if fingerprint is None:
+            with open(path, 'rb') as f:
+                fingerprint = hashlib.md5(f.read()).hexdigest()[:12]
+            self.hashes[key] = fingerprint
+        return fingerprint
+
+    # url_for('static', filename=...) adds ?v=<hash of the file>
+    def add_fingerprint(self, endpoint, values):
+        if endpoint == 'static' and 'filename' in values and 'v' not in values:
+            fingerprint = self.fingerprint(values['filename'])
+            if fingerprint is not None:
+                values['v'] = fingerprint
+
+    def cache_fingerprinted(self, response):
+        if request.endpoint == 'static' and request.args.get('v') and response.status_code in (200, 304):
+            response.cache_control.no_cache = None
+            response.cache_control.max_age = STATIC_MAX_AGE
+            response.cache_control.public = True
+            response.cache_control.immutable = True
+        return response
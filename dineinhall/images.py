@@ -0,0 +1,114 @@
+import hashlib
+import os
+import shutil
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image, ImageOps
+from flask import url_for
+
+
+# This file turns uploaded profile pictures into a few sizes in WebP and JPEG on a
+# worker pool, so a request only reads the upload and never decodes it.
+# Pictures are stored by content: the key is a hash of the uploaded bytes and the
+# variants live in <dir>/<key[:2]>/<key>/<size>.<ext>, so their urls never change
+# and can be cached forever, and the same upload is only processed once.
+
+DEFAULT_PICTURE = 'default.jpg'
+# variants never change once written so they can be cached for a year
+PICTURE_MAX_AGE = 365 * 24 * 60 * 60
+# length of the key stored in user.profile_pic
+KEY_LENGTH = 20
+FORMATS = {'webp': ('WEBP', {'quality': 80, 'method': 4}),
+           'jpg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True})}
+
+
+def picture_key(data):
+    return hashlib.sha256(data).hexdigest()[:KEY_LENGTH]
+
+
+# decodes an upload once and writes every size and format of it
+def render_variants(data, directory, sizes):
+    if os.path.isdir(directory):
+        return
+    image = Image.open(BytesIO(data))
+    # lets the JPEG decoder downscale by up to 8x while decoding instead of building the full image
+    image.draft('RGB', (max(sizes) * 2, max(sizes) * 2))
+    image = ImageOps.exif_transpose(image).convert('RGB')
+
+    # written next to the final directory and moved into place once every variant exists
+    staging = f'{directory}.{os.getpid()}.{threading.get_ident()}.tmp'
+    os.makedirs(staging, exist_ok=True)
+    try:
+        for size in sorted(sizes, reverse=True):
+            # each size is made from the previous larger one which is cheaper than from the original
+            image.thumbnail((size, size), Image.LANCZOS)
+            for ext, (fmt, options) in FORMATS.items():
+                image.save(os.path.join(staging, f'{size}.{ext}'), fmt, **options)
+        try:
+            os.rename(staging, directory)
+        except OSError:
+            # the same picture was finished by another worker first
+            pass
+    finally:
+        # still there when a save failed or the picture already existed, a partial set is never served
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+class PicturePipeline():
+    def __init__(self, app=None):
+        self.executor = None
+        self.pid = None
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.directory = app.config['PROFILE_PIC_DIR']
+        self.sizes = app.config['PROFILE_PIC_SIZES']
+        self.workers = app.config['PROFILE_PIC_WORKERS']
+        app.jinja_env.globals['picture_url'] = self.url
+
+    # the pool is created on first use in each process so it is never inherited across a fork
+    def get_executor(self):
+        with self.lock:
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='pictures')
+            return self.executor
+
+    def path(self, key, name=''):
+        return os.path.join(self.directory, key[:2], key, name)
+
+    # reads an uploaded file, queues its processing and returns the key to store on the user,
+    # on_ready(key) is called in an app context once every variant is in place
+    def submit(self, upload, on_ready=None):
+        data = upload.read()
+        key = picture_key(data)
+        future = self.get_executor().submit(render_variants, data, self.path(key).rstrip(os.sep), self.sizes)
+        future.add_done_callback(partial(self.report, key, on_ready))
+        return key
+
+    def report(self, key, on_ready, future):
+        if future.exception() is not None:
+            self.app.logger.error('could not process profile picture: %r', future.exception())
+        elif on_ready is not None:
+            with self.app.app_context():
+                try:
+                    on_ready(key)
+                except Exception:
+                    self.app.logger.exception('could not mark profile picture %s as ready', key)
+
+    # variants are only served once they are all written, until then the default picture is shown
+    def ready(self, key):
+        return key != DEFAULT_PICTURE and os.path.isdir(self.path(key))
+
+    # url of the variant closest to (and at least) the requested size
+    def url(self, key, size, ext='jpg'):
+        if not self.ready(key):
+            return url_for('static', filename=f'profile_pics/{DEFAULT_PICTURE}')
+        size = min((s for s in self.sizes if s >= size), default=max(self.sizes))
+        return url_for('users.profile_picture', key=key, name=f'{size}.{ext}')
@@ -0,0 +1,152 @@
+import json
+import os
+import queue
+import smtplib
+import threading
+import time
+from contextlib import ExitStack
+from datetime import datetime
+
+
+# This file sends emails from a background queue so requests never wait on SMTP.
+# Each worker thread keeps one SMTP connection open while there is mail to send,
+# sends what is queued in batches, retries temporary failures with backoff and records
+# messages it could not deliver in a dead-letter file.
+
+# a 5xx refusal of the sender, every recipient or the message itself will not change by sending it again
+def is_permanent(error):
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, (smtplib.SMTPSenderRefused, smtplib.SMTPDataError)):
+        return error.smtp_code >= 500
+    return False
+
+
+# one SMTP connection per worker thread, opened when there is mail to send
+class SMTPConnection():
+    def __init__(self, mail):
+        self.mail = mail
+        self.stack = ExitStack()
+        self.smtp = None
+
+    def send(self, msg):
+        if self.smtp is None:
+            self.smtp = self.stack.enter_context(self.mail.connect())
+        self.smtp.send(msg)
+
+    def close(self):
+        self.smtp = None
+        try:
+            self.stack.close()
+        except (smtplib.SMTPException, OSError):
+            pass
+
+
+class MailQueue():
+    def __init__(self, app=None):
+        self.app = None
+        self.queue = queue.Queue()
+        self.workers = []
+        self.pid = None
+        self.lock = threading.Lock()
+        self.dead_letter_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config['MAIL_QUEUE_ENABLED']
+        self.num_workers = app.config['MAIL_QUEUE_WORKERS']
+        self.batch_size = app.config['MAIL_BATCH_SIZE']
+        self.retries = app.config['MAIL_RETRIES']
+        self.backoff = app.config['MAIL_BACKOFF']
+        self.idle_timeout = app.config['MAIL_IDLE_TIMEOUT']
+        self.dead_letter_path = app.config['MAIL_DEAD_LETTER_PATH']
+
+    # queues a message and returns immediately, or sends it right away when the queue is disabled
+    def send(self, msg):
+        if not self.enabled:
+            self.app.extensions['mail'].send(msg)
+            return
+        self.start()
+        self.queue.put(msg)
+
+    # workers are started on first use in each process, so a preloaded master never forks running threads
+    def start(self):
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.queue = queue.Queue()
+            self.workers = [threading.Thread(target=self.work, name=f'mail-{index}', daemon=True)
+                            for index in range(self.num_workers)]
+            for worker in self.workers:
+                worker.start()
+
+    # waits until every queued message has been sent or dead-lettered
+    def flush(self):
+        self.queue.join()
+
+    def work(self):
+        with self.app.app_context():
+            connection = SMTPConnection(self.app.extensions['mail'])
+            while True:
+                try:
+                    batch = [self.queue.get(timeout=self.idle_timeout)]
+                except queue.Empty:
+                    # nothing to send for a while, hang up instead of waiting for the server to time out
+                    connection.close()
+                    batch = [self.queue.get()]
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                try:
+                    self.deliver(connection, batch)
+                except Exception:
+                    # the worker must outlive any failure or the queue would stop being drained
+                    self.app.logger.exception('could not deliver %d emails', len(batch))
+                    connection.close()
+                finally:
+                    for _ in batch:
+                        self.queue.task_done()
+
+    # sends a batch over the open connection one message at a time, a message that fails never holds back the others
+    def deliver(self, connection, batch):
+        for msg in batch:
+            self.deliver_one(connection, msg)
+
+    # a message the server refused for good is dead-lettered at once, other failures are retried
+    # with backoff on a new connection
+    def deliver_one(self, connection, msg):
+        for attempt in range(self.retries + 1):
+            try:
+                connection.send(msg)
+                return
+            except (smtplib.SMTPException, OSError) as e:
+                error = e
+                if is_permanent(e):
+                    # smtplib resets the transaction after a refusal so the connection is still usable
+                    break
+                connection.close()
+                if attempt < self.retries:
+                    time.sleep(self.backoff * 2 ** attempt)
+        self.dead_letter(msg, error)
+
+    # appends an undeliverable message to the dead-letter file as one json line
+    # the body is never written, reset emails carry a live token and the user can simply ask for a new one
+    def dead_letter(self, msg, error):
+        record = {
+            'failed_at': datetime.utcnow().isoformat(),
+            'error': repr(error),
+            'message_id': msg.msgId,
+            'subject': msg.subject,
+            'recipients': msg.recipients,
+        }
+        directory = os.path.dirname(self.dead_letter_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self.dead_letter_lock, open(self.dead_letter_path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+        self.app.logger.error('could not send email to %s: %r', ', '.join(msg.recipients), error)
@@ -0,0 +1,162 @@
+import re
+from sqlalchemy import select, and_, or_, bindparam, Float
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ColumnElement
+from sqlalchemy.sql.visitors import InternalTraversal
+from sqlalchemy.util import LRUCache
+
+from dineinhall.models import Food, Menu, FoodOnMenu, FoodRatingStats
+
+
+# This file builds the Advanced Search query from the Food, Menu and FoodOnMenu models.
+# Every filter is a bound parameter so each combination of filters always produces the
+# same SQL text, and filters that are not set are left out of the statement entirely.
+
+food = Food.__table__
+menu = Menu.__table__
+food_on_menu = FoodOnMenu.__table__
+rating_stats = FoodRatingStats.__table__
+
+# columns displayed by the advanced search page
+SEARCH_COLUMNS = [food.c.food_id, food.c.food_name, food.c.serving, food.c.calories,
+                  food.c.protein, food.c.total_carbs, food.c.total_fat, food.c.vegetarian,
+                  food.c.vegan, food.c.balanced, menu.c.location, menu.c.meal_type,
+                  menu.c.menu_date, rating_stats.c.average.label('ratings')]
+
+SEARCH_FROM = (menu.join(food_on_menu, food_on_menu.c.menu_id == menu.c.menu_id)
+                   .join(food, food.c.food_id == food_on_menu.c.food_id)
+                   .outerjoin(rating_stats, rating_stats.c.food_id == food.c.food_id))
+
+# InnoDB ignores words shorter than innodb_ft_min_token_size and its default stopwords
+MIN_TOKEN_SIZE = 3
+STOPWORDS = {'about', 'an', 'are', 'as', 'at', 'be', 'by', 'com', 'de', 'en', 'for', 'from', 'how',
+             'in', 'is', 'it', 'la', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was', 'what',
+             'when', 'where', 'who', 'will', 'with', 'und', 'www'}
+TOKEN_PATTERN = re.compile(r'\w+')
+
+# statements built for each shape of search, and their compiled SQL
+statement_cache = LRUCache(200)
+compiled_cache = LRUCache(200)
+
+
+# escapes the LIKE wildcards in a user supplied word
+def escape_like(word):
+    return word.replace('/', '//').replace('%', '/%').replace('_', '/_')
+
+
+# MySQL full-text match over the given columns, its value is the relevance of the row
+class MatchAgainst(ColumnElement):
+    type = Float()
+    # the columns and the bound search terms make up its part of the statement cache key
+    inherit_cache = True
+    _traverse_internals = [('columns', InternalTraversal.dp_clauseelement_tuple),
+                           ('against', InternalTraversal.dp_clauseelement)]
+
+    def __init__(self, columns, against):
+        self.columns = tuple(columns)
+        self.against = against
+
+
+@compiles(MatchAgainst)
+def compile_match_against(element, compiler, **kw):
+    columns = ', '.join(compiler.process(column, **kw) for column in element.columns)
+    return f'match ({columns}) against ({compiler.process(element.against, **kw)} in boolean mode)'
+
+
+# splits the searched food name into full-text terms and words too short or common to be indexed
+def tokenize(foodName):
+    terms, words = [], []
+    for token in TOKEN_PATTERN.findall(foodName.lower()):
+        if len(token) >= MIN_TOKEN_SIZE and token not in STOPWORDS:
+            # every term is required and also matches longer words starting with it
+            terms.append(f'+{token}*')
+        else:
+            words.append(token)
+    return ' '.join(terms), words
+
+
+class SearchQuery():
+    def __init__(self, menu_date, meal, locations, food_name='', max_calories=None, min_protein=None,
+                 max_fat=None, max_carbs=None, min_rating=None, vegetarian=False, vegan=False, balanced=False):
+        self.menu_date = menu_date
+        self.meal = meal
+        self.locations = list(locations)
+        self.food_terms, self.food_words = tokenize(food_name or '')
+        self.max_calories = max_calories
+        self.min_protein = min_protein
+        self.max_fat = max_fat
+        self.max_carbs = max_carbs
+        self.min_rating = min_rating
+        self.vegetarian = vegetarian
+        self.vegan = vegan
+        self.balanced = balanced
+
+    # which filters are in use, searches with the same shape share one statement
+    def shape(self):
+        return (bool(self.food_terms), len(self.food_words), self.max_calories is not None, self.min_protein is not None,
+                self.max_fat is not None, self.max_carbs is not None, self.min_rating is not None,
+                bool(self.vegetarian), bool(self.vegan), bool(self.balanced))
+
+    def params(self):
+        params = {'menu_date': self.menu_date, 'meal': self.meal, 'locations': self.locations}
+        optional = {'max_calories': self.max_calories, 'min_protein': self.min_protein,
+                    'max_fat': self.max_fat, 'max_carbs': self.max_carbs, 'min_rating': self.min_rating}
+        params.update({key: value for key, value in optional.items() if value is not None})
+        if self.food_terms:
+            params['food_terms'] = self.food_terms
+        for num, word in enumerate(self.food_words):
+            params[f'word_{num}'] = f'%{escape_like(word)}%'
+        return params
+
+    def statement(self):
+        shape = self.shape()
+        stmt = statement_cache.get(shape)
+        if stmt is None:
+            stmt = build_statement(*shape)
+            statement_cache[shape] = stmt
+        return stmt
+
+    def execute(self, con):
+        return con.execution_options(compiled_cache=compiled_cache).execute(self.statement(), self.params())
+
+
+# builds the search statement for one shape of search
+def build_statement(terms, num_words, calories, protein, fat, carbs, rating, vegetarian, vegan, balanced):
+    columns = list(SEARCH_COLUMNS)
+    conditions = [menu.c.menu_date == bindparam('menu_date'),
+                  menu.c.meal_type == bindparam('meal'),
+                  menu.c.location.in_(bindparam('locations', expanding=True))]
+    order = [menu.c.location.desc(), menu.c.meal_type.asc(), food.c.calories.desc(), food.c.food_name.desc()]
+    # find the food items whose name or description contain every searched term using the full-text index
+    if terms:
+        relevance = MatchAgainst([food.c.food_name, food.c.description], bindparam('food_terms'))
+        columns.append(relevance.label('relevance'))
+        conditions.append(relevance > 0)
+        # best matches first within each location and meal
+        order.insert(2, relevance.desc())
+    # words the index skips must still be contained in the food name
+    for num in range(num_words):
+        conditions.append(food.c.food_name.like(bindparam(f'word_{num}'), escape='/'))
+    if calories:
+        conditions.append(food.c.calories <= bindparam('max_calories'))
+    if protein:
+        conditions.append(food.c.protein >= bindparam('min_protein'))
+    if fat:
+        conditions.append(food.c.total_fat <= bindparam('max_fat'))
+    if carbs:
+        conditions.append(food.c.total_carbs <= bindparam('max_carbs'))
+    # foods with ratings greater than or equal to the given rating (including not yet rated)
+    if rating:
+        conditions.append(or_(rating_stats.c.average >= bindparam('min_rating'),
+                              rating_stats.c.average.is_(None)))
+    if vegetarian:
+        conditions.append(food.c.vegetarian.is_(True))
+    if vegan:
+        conditions.append(food.c.vegan.is_(True))
+    if balanced:
+        conditions.append(food.c.balanced.is_(True))
+    return (select(columns)
+            .select_from(SEARCH_FROM)
+            .where(and_(*conditions))
+            .distinct()
+            .order_by(*order))
@@ -1,16 +1,16 @@
-from datetime import datetime
-from flask import render_template, Blueprint, redirect, url_for, flash
-from pytz import timezone
-from sqlalchemy import create_engine
+import click
+from datetime import datetime, timedelta
+from flask import render_template, Blueprint, redirect, url_for, flash, jsonify, abort, current_app, make_response
+from pytz import timezone, utc
 
 from .forms import SearchForm
-from dineinhall.config import Config
+from .queries import SearchQuery
+from dineinhall.database import connect, get_pool_status
+from dineinhall.http_caching import page_etag, not_modified, with_validators
+from dineinhall.menus import get_menu_foods, get_menu_version, rebuild_snapshots
 
 main = Blueprint('main', __name__)
 
-# allows us to recreate SQL query statements in Python
-engine = create_engine(Config.SQLALCHEMY_DATABASE_URI)
-
 
 # routes the user to the home page
 @main.route("/")
@@ -27,21 +27,27 @@ def menu():
 # routes the user to the menu page with the given location tag
 @main.route("/menu/<loc>")
 def filteredLocations(loc):
-    with engine.connect() as con:
-        # find all the foods for the current date from the given location
-        rs = con.execute('select distinct * '
-                         'from menu join food_on_menu using (menu_id) '
-                         ' join food using (food_id) where menu_date '
-                         f"= curdate() and location like '{loc}'")
-
-    foods = list(rs)
+    locations = {'Stwest': False, 'IV': False, 'Steast': False}
+    # set a timezone to avoid the inconsistent timezone of the Heroku server
+    curdate = datetime.now(timezone('US/Eastern')).strftime("%Y-%m-%d")
+    # the page only changes when the day's menus are scraped again
+    version = get_menu_version(loc, curdate) if loc in locations else None
+    last_modified = utc.localize(version) if version is not None else None
+    etag = page_etag('menu', loc, curdate, version)
+    response = not_modified(etag, last_modified)
+    if response is not None:
+        return response
+    if loc in locations:
+        foods = get_menu_foods(loc, curdate, version)
+    else:
+        foods = []
     # if there is no food available that day, the location is closed
     closed = len(foods) == 0
-    locations = {'Stwest': False, 'IV': False, 'Steast': False}
     # sets the used location to be true in order to display location name
     locations[loc] = True
 
-    return render_template('menu.html', allFoods=foods, stwest=locations['Stwest'], iv=locations['IV'], steast=locations['Steast'], closed=closed, title=loc)
+    page = render_template('menu.html', allFoods=foods, stwest=locations['Stwest'], iv=locations['IV'], steast=locations['Steast'], closed=closed, title=loc)
+    return with_validators(make_response(page), etag, last_modified)
 
 
 # the advanced search page for querying foods using specific attributes
@@ -51,68 +57,35 @@ def search():
     form = SearchForm()
     # if form is submitted successfully
     if form.validate_on_submit():
-        # boolean values for location
-        iv = form.iv.data
-        steast = form.steast.data
-        stwest = form.stwest.data
-        # numeric values for nutrients
-        calories = form.calories.data
-        protein = form.protein.data
-        fat = form.fat.data
-        carbs = form.carbs.data
-        # breakfast, lunch, or dinner
-        meal = form.meal.data
-        # split food name into a list of strings
-        foodName = form.foodName.data.split()
-        # rating on a 5pt scale
-        rating = form.rating.data
-        # boolean values for food properties
-        vegetarian = form.vegetarian.data
-        vegan = form.vegan.data
-        balanced = form.balanced.data
-        foodNameQuery = "true "
-        # for each word in the searched food find a food item that contains the given word
-        for word in foodName:
-            foodNameQuery += f"and food_name like '%%{word}%%' "
+        # dining hall locations the user chose
+        locations = [loc for loc, chosen in (('IV', form.iv.data), ('Steast', form.steast.data), ('Stwest', form.stwest.data)) if chosen]
         # if user does not choose any location, shows all by default
-        if not(iv or steast or stwest):
-            iv, steast, stwest = True, True, True
-        # foods from dining hall locations
-        iv = "location like 'IV'" if iv else False
-        steast = "location like 'Steast'" if steast else False
-        stwest = "location like 'Stwest'" if stwest else False
-        # foods less or equal to than the given calories
-        calories = f"calories <= {calories}" if calories is not None else True
-        # foods more than or equal to the given protein
-        protein = f"protein >= {protein}" if protein is not None else True
-        # foods less than or equal to the given fat
-        fat = f"total_fat <= {fat}" if fat is not None else True
-        # foods less than or equal to the given carbs
-        carbs = f"total_carbs <= {carbs}" if carbs is not None else True
-        # foods with ratings greater than or equal to the given rating (including not yet rated)
-        rating = f"(ratings >= {rating} or isnull(ratings))" if rating is not None else True
-        vegetarian = "vegetarian = True" if vegetarian else True
-        vegan = "vegan = True" if vegan else True
-        balanced = "balanced = True" if balanced else True
+        if not locations:
+            locations = ['IV', 'Steast', 'Stwest']
         # set a timezone to avoid the inconsistent timezone of the Heroku server
         curdate = datetime.now(timezone('US/Eastern'))  # EST timezone
         curdate = curdate.strftime("%Y-%m-%d")
-        with engine.connect() as con:
-            # main query searching for food items with all the specified attributes
-            # if a value is not given deafault it to True so the query skips over it
-            foods = con.execute("select distinct * "
-                                f"from menu join food_on_menu using (menu_id) "
-                                f"join food using (food_id) "
-                                f"left join (select food_id, round(avg(stars), 2) ratings from rating group by food_id) food_ratings "
-                                f"using (food_id) where menu_date = '{curdate}' "
-                                f"and ({iv} or {steast} or {stwest}) "
-                                f"and {calories} and {protein} and {fat} and {carbs} "
-                                f"and meal_type like '{meal}' "
-                                f"and {rating} "
-                                f"and {foodNameQuery} "
-                                f"and {vegetarian} and {vegan} and {balanced} "
-                                f"order by location desc, meal_type asc, calories desc, food_name desc")
-        foods = list(foods)
+        # filters which are not given are left out of the query
+        query = SearchQuery(menu_date=curdate,
+                            # breakfast, lunch, or dinner
+                            meal=form.meal.data,
+                            locations=locations,
+                            # searched against the full-text index of food names
+                            food_name=form.foodName.data,
+                            # foods less than or equal to the given calories, fat and carbs
+                            max_calories=form.calories.data,
+                            max_fat=form.fat.data,
+                            max_carbs=form.carbs.data,
+                            # foods more than or equal to the given protein
+                            min_protein=form.protein.data,
+                            # foods with ratings greater than or equal to the given rating
+                            min_rating=form.rating.data,
+                            # boolean values for food properties
+                            vegetarian=form.vegetarian.data,
+                            vegan=form.vegan.data,
+                            balanced=form.balanced.data)
+        with connect() as con:
+            foods = list(query.execute(con))
         size = len(foods)
         # if there are no foods for the given specifications
         if size == 0:
@@ -124,3 +97,19 @@ def search():
         # default message which pops up once going to the page
         flash('Start Searching!', 'success')
     return render_template('advancedSearch.html', title='Advanced Search', form=form, allFoods=foods)
+
+
+# reports checkout latency and saturation of the shared connection pool
+@main.route("/status/pool")
+def poolStatus():
+    if not current_app.config['POOL_STATUS_ENABLED']:
+        abort(404)
+    return jsonify(get_pool_status())
+
+
+# rebuilds the menu snapshots of the days kept by the retention policy and drops the older ones
+@main.cli.command('rebuild-menu-snapshots')
+def rebuildMenuSnapshots():
+    today = datetime.now(timezone('US/Eastern')).date()
+    built, dropped = rebuild_snapshots(today - timedelta(days=current_app.config['MENU_SNAPSHOT_RETENTION_DAYS']))
+    click.echo(f'Built {built} menu snapshots and dropped {dropped} old ones')
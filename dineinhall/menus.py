@@ -0,0 +1,108 @@
+import json
+from datetime import datetime
+from sqlalchemy import text
+
+from dineinhall import menu_cache
+from dineinhall.catalog import MenuItem, menu_item_from_row
+from dineinhall.database import connect, begin
+
+
+# This file serves the foods on each menu, read only, from the menu cache when possible.
+# Behind the cache, each menu is read from its snapshot: the rows of the menu page stored
+# for every (date, location, meal type) by the scraper when the menu changes. Days without
+# snapshots, older than the retention or scraped before snapshots existed, are read from
+# the menu, food_on_menu and food tables instead.
+
+# default of get_menu_foods' version, None is a valid version (a day never scraped)
+MISSING = object()
+
+MENU_ITEMS_QUERY = ('select food_id, food_name, meal_type, serving, calories, protein, total_carbs, total_fat '
+                    'from menu join food_on_menu using (menu_id) '
+                    'join food using (food_id) '
+                    'where menu_date = :curdate and location = :loc')
+
+
+# the foods of a menu from the normalized tables
+def read_menu(con, loc, curdate):
+    return [menu_item_from_row(row) for row in con.execute(text(MENU_ITEMS_QUERY), curdate=curdate, loc=loc)]
+
+
+# the foods of a menu from its snapshots, None when the day has none
+def read_snapshots(con, loc, curdate):
+    rs = con.execute(text('select items from menu_snapshot where menu_date = :curdate and location = :loc'),
+                     curdate=curdate, loc=loc)
+    snapshots = [row['items'] for row in rs]
+    if not snapshots:
+        return None
+    return [MenuItem(*values) for items in snapshots for values in json.loads(items)]
+
+
+# all the foods for the given date and location, version is the day's get_menu_version when already known
+# cached menus are only used while their version is the current one, so they are never older than the version
+def get_menu_foods(loc, curdate, version=MISSING):
+    if version is MISSING:
+        version = get_menu_version(loc, curdate)
+    version = version.isoformat() if version is not None else ''
+    cached = menu_cache.get(loc, curdate)
+    if cached is None or cached[0] != version:
+        with connect() as con:
+            items = read_snapshots(con, loc, curdate)
+            if items is None:
+                items = read_menu(con, loc, curdate)
+        menu_cache.set(loc, curdate, [version, items])
+        return items
+    # cached items come back as plain lists from a shared cache
+    return [item if isinstance(item, MenuItem) else MenuItem(*item) for item in cached[1]]
+
+
+# writes the snapshots of every meal of the given (location, date) days from the normalized tables,
+# on the connection of the transaction that changed them so both are committed together
+def build_snapshots(con, days):
+    built_at = datetime.utcnow().replace(microsecond=0)
+    rows = []
+    for loc, menu_date in days:
+        meals = {}
+        for item in read_menu(con, loc, menu_date):
+            meals.setdefault(item.meal_type, []).append(list(item))
+        rows.extend({'menu_date': menu_date, 'location': loc, 'meal_type': meal_type, 'built_at': built_at,
+                     'items': json.dumps(items, separators=(',', ':'))}
+                    for meal_type, items in meals.items())
+    if rows:
+        con.execute(text('insert into menu_snapshot (menu_date, location, meal_type, items, built_at) '
+                         'values (:menu_date, :location, :meal_type, :items, :built_at) '
+                         'on duplicate key update items = values(items), built_at = values(built_at)'), rows)
+    return len(rows)
+
+
+# retention policy, snapshots of days before the cutoff are dropped and those days are read from
+# the normalized tables again, which keep every menu
+def compact_snapshots(con, cutoff):
+    return con.execute(text('delete from menu_snapshot where menu_date < :cutoff'), cutoff=cutoff).rowcount
+
+
+# rebuilds the snapshots of every day from the cutoff on and drops the older ones
+def rebuild_snapshots(cutoff):
+    with begin() as con:
+        days = [(row['location'], row['menu_date']) for row in
+                con.execute(text('select distinct location, date(menu_date) as menu_date from menu '
+                                 'where menu_date >= :cutoff and location is not null'), cutoff=cutoff)]
+        built = build_snapshots(con, days)
+        dropped = compact_snapshots(con, cutoff)
+    menu_cache.invalidate()
+    return built, dropped
+
+
+# when the menus of the given date and location last changed in UTC, None if they never were scraped
+# cached like the menus, only for MENU_VERSION_TTL seconds on the memory backend which a scrape
+# in another process cannot invalidate
+def get_menu_version(loc, curdate):
+    version = menu_cache.get(loc, curdate, meal_type='version')
+    if version is None:
+        with connect() as con:
+            scraped_at = con.execute(text('select scraped_at from menu_version '
+                                          'where menu_date = :curdate and location = :loc'),
+                                     curdate=curdate, loc=loc).scalar()
+        # cached as text so either cache backend can hold it, with "" for a day without menus
+        version = scraped_at.isoformat() if scraped_at is not None else ''
+        menu_cache.set(loc, curdate, version, meal_type='version', ttl=menu_cache.version_ttl)
+    return datetime.fromisoformat(version) if version else None
@@ -1,16 +1,29 @@
+from datetime import datetime
 from itsdangerous import TimedJSONWebSignatureSerializer as Serializer
 
 from .config import Config
-from dineinhall import db, login_manager
+from dineinhall import db, login_manager, user_cache
 from flask_login import UserMixin
+from sqlalchemy.orm import make_transient_to_detached
 
 
 # This file is used to create table models for SQLAlchemy.
 # It allows for the SQLAlchemy API to interract with the database.
 
+# runs on every request from a logged in user, served from the user cache when possible
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    values = user_cache.get(int(user_id))
+    if values is None:
+        user = User.query.get(int(user_id))
+        if user is not None:
+            user_cache.set(user)
+        return user
+    user = User(**values)
+    make_transient_to_detached(user)
+    # attaches the user to the session without a query, changes to it are still saved on commit
+    # and the columns left out of the cache (the password) are loaded only if they are used
+    return db.session.merge(user, load=False)
 
 
 # Model for the user table in the database.
@@ -20,6 +33,8 @@ class User(db.Model, UserMixin):
     email = db.Column(db.String(120), unique=True, nullable=False)
     profile_pic = db.Column(db.String(20), nullable=False, default='default.jpg')
     password = db.Column(db.String(60), nullable=False)
+    # when the row last changed in UTC, review pages show the names and pictures of their reviewers
+    updated_at = db.Column(db.DateTime, nullable=True, index=True, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # get user_id
     def get_id(self):
@@ -46,6 +61,9 @@ class User(db.Model, UserMixin):
 
 # Model for the food table in the database.
 class Food(db.Model):
+    # full-text index used by the food name search
+    __table_args__ = (db.Index('ft_food_name_description', 'food_name', 'description', mysql_prefix='FULLTEXT'),)
+
     food_id = db.Column(db.Integer, primary_key=True)
     food_name = db.Column(db.String(100), nullable=True)
     serving = db.Column(db.Integer, nullable=True)
@@ -64,27 +82,76 @@ class Food(db.Model):
     vegetarian = db.Column(db.Boolean, nullable=False)
     vegan = db.Column(db.Boolean, nullable=False)
     balanced = db.Column(db.Boolean, nullable=False)
+    description = db.Column(db.Text, nullable=True)
 
 
 # Model for the menu table in the database.
 class Menu(db.Model):
+    __table_args__ = (db.Index('ix_menu_date_location_meal', 'menu_date', 'location', 'meal_type'),)
+
     menu_id = db.Column(db.Integer, primary_key=True)
     meal_type = db.Column(db.Enum('breakfast', 'lunch', 'dinner'), nullable=False)
     location = db.Column(db.Enum('Stwest', 'Steast', 'IV'), nullable=True)
     menu_date = db.Column(db.DateTime, nullable=True)
 
 
+# Model for the menu_version table in the database.
+# Holds when the menus of each location and day last changed, used to validate cached pages.
+class MenuVersion(db.Model):
+    menu_date = db.Column(db.Date, primary_key=True)
+    location = db.Column(db.Enum('Stwest', 'Steast', 'IV'), primary_key=True)
+    scraped_at = db.Column(db.DateTime, nullable=False)
+
+
+# Model for the menu_snapshot table in the database.
+# Holds the foods of each menu as they are shown on the menu page, as a JSON list of rows in
+# MenuItem order, so a page is served with one primary key lookup instead of a three table join.
+class MenuSnapshot(db.Model):
+    menu_date = db.Column(db.Date, primary_key=True)
+    location = db.Column(db.Enum('Stwest', 'Steast', 'IV'), primary_key=True)
+    meal_type = db.Column(db.Enum('breakfast', 'lunch', 'dinner'), primary_key=True)
+    items = db.Column(db.Text(length=16777215), nullable=False)
+    built_at = db.Column(db.DateTime, nullable=False)
+
+
 # Model for the food_on_menu table in the database.
 class FoodOnMenu(db.Model):
+    # index in the menu -> food_on_menu join direction
+    __table_args__ = (db.Index('ix_food_on_menu_menu_food', 'menu_id', 'food_id'),)
+
     # compound primary keys
-    food_id = db.Column(db.Integer, db.ForeignKey('menu.menu_id'), primary_key=True, nullable=False)
-    menu_id = db.Column(db.Integer, db.ForeignKey('food.food_id'), primary_key=True, nullable=False)
+    food_id = db.Column(db.Integer, db.ForeignKey('food.food_id'), primary_key=True, nullable=False)
+    menu_id = db.Column(db.Integer, db.ForeignKey('menu.menu_id'), primary_key=True, nullable=False)
 
 
 # Model for the rating table in the database.
 class Rating(db.Model):
+    # indexes for paging through reviews newest first on (timestamp, user_id, food_id)
+    __table_args__ = (db.Index('ix_rating_keyset', 'timestamp', 'user_id', 'food_id'),
+                      db.Index('ix_rating_food_keyset', 'food_id', 'timestamp', 'user_id'),
+                      db.Index('ix_rating_user_keyset', 'user_id', 'timestamp', 'food_id'))
+
     user_id = db.Column(db.Integer, db.ForeignKey('user.user_id'), primary_key=True, nullable=False)
     food_id = db.Column(db.Integer, db.ForeignKey('food.food_id'), primary_key=True, nullable=False)
     stars = db.Column(db.Integer, nullable=False)
     description = db.Column(db.String(300), nullable=True)
     timestamp = db.Column(db.DateTime, nullable=True)
+
+
+# Model for the food_rating_stats table in the database.
+# Holds the rating aggregates of each food so they are not recomputed per request.
+class FoodRatingStats(db.Model):
+    food_id = db.Column(db.Integer, db.ForeignKey('food.food_id'), primary_key=True, nullable=False)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    average = db.Column(db.Numeric(3, 2), nullable=True)
+    # histogram of the number of ratings with each star value
+    stars_1 = db.Column(db.Integer, nullable=False, default=0)
+    stars_2 = db.Column(db.Integer, nullable=False, default=0)
+    stars_3 = db.Column(db.Integer, nullable=False, default=0)
+    stars_4 = db.Column(db.Integer, nullable=False, default=0)
+    stars_5 = db.Column(db.Integer, nullable=False, default=0)
+
+    # number of ratings for each star value from 1 to 5
+    def histogram(self):
+        return [self.stars_1, self.stars_2, self.stars_3, self.stars_4, self.stars_5]
@@ -0,0 +1,137 @@
+import fcntl
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+from werkzeug.exceptions import ServiceUnavailable
+
+
+# This file hashes and checks passwords with bcrypt on a small process pool at a lower priority.
+# At most PASSWORD_HASH_SLOTS passwords are hashed at once across every web worker of the host,
+# so a burst of logins or sign-ups leaves the other cores to requests that do not touch passwords,
+# and logins that cannot get a slot in time get a 503 instead of queueing up.
+
+# seconds between two looks for a free hashing slot
+SLOT_POLL_INTERVAL = 0.01
+BUSY_MESSAGE = 'Too many sign-ins at once, please try again in a moment.'
+
+def hash_password(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+# a malformed or legacy hash never matches
+def check_password(pw_hash, password):
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), pw_hash.encode('utf-8'))
+    except ValueError:
+        return False
+
+
+# the cost factor a hash was made with, from its "$2b$<rounds>$..." prefix, None when it has none
+def hash_rounds(pw_hash):
+    try:
+        return int(pw_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+# slots shared by every process of the host, each one is a lock file held while a password is hashed
+# the file locks are POSIX record locks, which belong to the process and are not inherited by the
+# hashing processes forked while one is held, so threads of a process also take a lock of their own
+class HashSlots():
+    def __init__(self, directory, slots):
+        self.directory = directory
+        self.locks = [threading.Lock() for _ in range(slots)]
+        os.makedirs(directory, exist_ok=True)
+
+    # the index and open file of a free slot, None when none frees up before the timeout
+    def acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            for index, lock in enumerate(self.locks):
+                if not lock.acquire(blocking=False):
+                    continue
+                f = open(os.path.join(self.directory, f'slot-{index}'), 'a')
+                try:
+                    fcntl.lockf(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return index, f
+                except OSError:
+                    f.close()
+                    lock.release()
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(SLOT_POLL_INTERVAL)
+
+    # closing the file releases its lock, also when the process dies
+    def release(self, slot):
+        index, f = slot
+        f.close()
+        self.locks[index].release()
+
+
+class PasswordHasher():
+    def __init__(self, app=None):
+        self.executor = None
+        self.pid = None
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.configure(app.config['BCRYPT_LOG_ROUNDS'], app.config['PASSWORD_HASH_WORKERS'],
+                       app.config['PASSWORD_HASH_MAX_PENDING'], app.config['PASSWORD_HASH_TIMEOUT'],
+                       slots=HashSlots(app.config['PASSWORD_HASH_LOCK_DIR'], app.config['PASSWORD_HASH_SLOTS']),
+                       nice=app.config['PASSWORD_HASH_NICE'])
+
+    # workers set to 0 hashes in the request thread instead of the pool, without slots the number
+    # of passwords hashed at once is only bounded per process
+    def configure(self, rounds, workers, max_pending, timeout, slots=None, nice=0):
+        self.rounds = rounds
+        self.workers = workers
+        self.timeout = timeout
+        self.slots = slots
+        self.nice = nice
+        # hashes waiting for or running on the pool, more than this are turned away
+        self.pending = threading.BoundedSemaphore(max_pending)
+
+    # the pool is created on first use in each process so it is never inherited across a fork
+    def get_executor(self):
+        with self.lock:
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=os.nice,
+                                                    initargs=(self.nice,))
+            return self.executor
+
+    def run(self, fn, *args):
+        if not self.pending.acquire(timeout=self.timeout):
+            raise ServiceUnavailable(BUSY_MESSAGE)
+        try:
+            if self.slots is None:
+                return self.call(fn, *args)
+            slot = self.slots.acquire(self.timeout)
+            if slot is None:
+                raise ServiceUnavailable(BUSY_MESSAGE)
+            try:
+                return self.call(fn, *args)
+            finally:
+                self.slots.release(slot)
+        finally:
+            self.pending.release()
+
+    def call(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        return self.get_executor().submit(fn, *args).result()
+
+    def hash(self, password):
+        return self.run(hash_password, password, self.rounds)
+
+    def check(self, pw_hash, password):
+        return self.run(check_password, pw_hash, password)
+
+    # true when a hash was made with a different cost factor than the configured one, or is not a bcrypt hash
+    def needs_rehash(self, pw_hash):
+        return hash_rounds(pw_hash) != self.rounds
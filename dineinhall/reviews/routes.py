@@ -1,19 +1,18 @@
+import click
 from datetime import datetime
-from flask import render_template, Blueprint, redirect, url_for, flash
+from flask import render_template, Blueprint, redirect, url_for, flash, request, current_app, make_response
 from flask_login import current_user, login_required
 from pytz import timezone
-from sqlalchemy import create_engine
 
 from .forms import ReviewForm
+from .utils import record_rating, rebuild_rating_stats, fetch_review_page, rating_version
 from dineinhall import db
-from dineinhall.config import Config
-from dineinhall.models import Rating
+from dineinhall.database import connect
+from dineinhall.http_caching import page_etag, not_modified, with_validators
+from dineinhall.models import Rating, FoodRatingStats
 
 review = Blueprint('review', __name__)
 
-# allows us to recreate SQL query statements in Python
-engine = create_engine(Config.SQLALCHEMY_DATABASE_URI)
-
 
 # page where user creates a new review (must be logged in)
 @review.route("/newReview/<food_id>", methods=['GET', 'POST'])
@@ -32,9 +31,13 @@ def newReview(food_id):
         rating = Rating(user_id=user_id, food_id=food_id, stars=stars, description=description, timestamp=timestamp)
         try:
             db.session.add(rating)
+            # flush first so a duplicate review fails before the aggregates change
+            db.session.flush()
+            record_rating(int(food_id), stars)
             db.session.commit()
             flash('Succesfully reviewed', 'success')
         except Exception:
+            db.session.rollback()
             flash('Error in submitting review', 'danger')
     return render_template('newRating.html', title='New Review', form=form)
 
@@ -48,23 +51,40 @@ def reviews():
 # displays the reviews and rating for the specified food
 @review.route("/reviews/<food_id>")
 def foodReview(food_id):
-    if int(food_id) == -1:
-        food_id = True
-    else:
-        food_id = f'food_id = {food_id}'
-    with engine.connect() as con:
-        # all the reviews for the given food id where the description exists
-        reviews = con.execute("select * "
-                              f"from food join rating using (food_id) "
-                              f"join user using (user_id) "
-                              f"where not isnull(rating.description) and {food_id} "
-                              f"order by timestamp desc")
-    reviews = list(reviews)
+    food_id = int(food_id)
+    with connect() as con:
+        # the page only changes when a review is added or a reviewer renames themselves or changes picture
+        last_rated, rating_count, users_changed = rating_version(con, food_id if food_id != -1 else None)
+        # rating timestamps are stored in EST
+        last_modified = timezone('US/Eastern').localize(last_rated) if last_rated is not None else None
+        etag = page_etag('reviews', food_id, last_rated, rating_count, users_changed)
+        response = not_modified(etag, last_modified)
+        if response is not None:
+            return response
+
+        stats = None
+        conditions, params = [], {}
+        if food_id != -1:
+            # rating aggregates for the food
+            stats = FoodRatingStats.query.get(food_id)
+            conditions.append('rating.food_id = :review_food_id')
+            params['review_food_id'] = food_id
+        # one page of the reviews for the given food id where the description exists
+        reviews, next_cursor = fetch_review_page(con, conditions, params, cursor=request.args.get('before'),
+                                                 page_size=current_app.config['REVIEWS_PAGE_SIZE'])
     size = len(reviews)
 
     # if there are no reviews for the given food id
     if size == 0:
         flash('No reviews found', 'danger')
     else:
-        flash(f'Found {size} reviews!', 'success')
-    return render_template('reviews.html', title='Ratings', reviews=reviews)
+        flash(f'Showing {size} reviews!', 'success')
+    page = render_template('reviews.html', title='Ratings', reviews=reviews, stats=stats, next_cursor=next_cursor)
+    return with_validators(make_response(page), etag, last_modified)
+
+
+# recomputes the rating aggregates of every food from scratch
+@review.cli.command('rebuild-rating-stats')
+def rebuildRatingStats():
+    count = rebuild_rating_stats()
+    click.echo(f'Rebuilt rating stats for {count} foods')
@@ -0,0 +1,120 @@
+from datetime import datetime
+from sqlalchemy import text
+
+from dineinhall import db
+from dineinhall.database import begin
+
+
+# adds a new rating to the food's aggregates in the current session
+# so it is committed in the same transaction as the rating itself
+def record_rating(food_id, stars):
+    params = {'food_id': food_id, 'stars': stars}
+    for num in range(1, 6):
+        params[f'stars_{num}'] = int(stars == num)
+    db.session.execute(text('insert into food_rating_stats '
+                            '(food_id, rating_count, rating_sum, average, stars_1, stars_2, stars_3, stars_4, stars_5) '
+                            'values (:food_id, 1, :stars, :stars, :stars_1, :stars_2, :stars_3, :stars_4, :stars_5) '
+                            'on duplicate key update rating_count = rating_count + 1, rating_sum = rating_sum + :stars, '
+                            'stars_1 = stars_1 + :stars_1, stars_2 = stars_2 + :stars_2, stars_3 = stars_3 + :stars_3, '
+                            'stars_4 = stars_4 + :stars_4, stars_5 = stars_5 + :stars_5'), params)
+    db.session.execute(text('update food_rating_stats set average = round(rating_sum / rating_count, 2) '
+                            'where food_id = :food_id'), params)
+
+
+# recomputes the aggregates of every food from the rating table
+def rebuild_rating_stats():
+    with begin() as con:
+        con.execute('delete from food_rating_stats')
+        rs = con.execute('insert into food_rating_stats '
+                         '(food_id, rating_count, rating_sum, average, stars_1, stars_2, stars_3, stars_4, stars_5) '
+                         'select food_id, count(*), sum(stars), round(avg(stars), 2), sum(stars = 1), '
+                         'sum(stars = 2), sum(stars = 3), sum(stars = 4), sum(stars = 5) '
+                         'from rating group by food_id')
+    return rs.rowcount
+
+
+# columns displayed by the reviews page
+REVIEW_COLUMNS = ('rating.user_id, rating.food_id, user.user_name, user.profile_pic, food.food_name, '
+                  'rating.stars, rating.description, rating.timestamp')
+
+
+# reviews saved without a timestamp come after all the others, their cursors say "null" instead
+NULL_TIMESTAMP = 'null'
+
+
+# the position of a review in the newest first ordering used as a "next page" link
+def encode_cursor(review):
+    timestamp = review.timestamp.strftime('%Y%m%d%H%M%S') if review.timestamp is not None else NULL_TIMESTAMP
+    return f"{timestamp}-{review.user_id}-{review.food_id}"
+
+
+# returns the (timestamp, user_id, food_id) in the cursor, or None if it is not valid
+def decode_cursor(cursor):
+    try:
+        timestamp, user_id, food_id = cursor.split('-')
+        timestamp = datetime.strptime(timestamp, '%Y%m%d%H%M%S') if timestamp != NULL_TIMESTAMP else None
+        return timestamp, int(user_id), int(food_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+# conditions of a review page: only reviews with a description, those with a timestamp are paged first
+# and those without one after them, each part after the position of a cursor when there is one
+WITH_DESCRIPTION = 'not isnull(rating.description)'
+DATED = 'rating.timestamp is not null'
+UNDATED = 'rating.timestamp is null'
+AFTER = '(rating.user_id < :user_id or (rating.user_id = :user_id and rating.food_id < :food_id))'
+AFTER_DATED = f'(rating.timestamp < :timestamp or (rating.timestamp = :timestamp and {AFTER}))'
+
+
+# one query of a review page, ordered along the keyset indexes so MySQL reads only the rows it returns
+def review_query(conditions):
+    return (f'select {REVIEW_COLUMNS} '
+            'from rating join food using (food_id) '
+            'join user using (user_id) '
+            f"where {' and '.join(conditions)} "
+            'order by rating.timestamp desc, rating.user_id desc, rating.food_id desc '
+            'limit :limit')
+
+
+def select_reviews(con, conditions, params, limit):
+    return list(con.execute(text(review_query(conditions)), dict(params, limit=limit)))
+
+
+# fetches one page of reviews with a description, newest first and those without a timestamp last,
+# matching the given conditions
+# returns the reviews and the cursor for the next page (None on the last page)
+def fetch_review_page(con, conditions, params, cursor=None, page_size=20):
+    conditions = [WITH_DESCRIPTION] + list(conditions)
+    params = dict(params)
+    position = decode_cursor(cursor) if cursor else None
+    if position is not None:
+        params['timestamp'], params['user_id'], params['food_id'] = position
+    reviews = []
+    # reviews with a timestamp come first, as a plain range over the index
+    if position is None or position[0] is not None:
+        # only reviews that come after the last one on the previous page
+        dated = [DATED] if position is None else [DATED, AFTER_DATED]
+        # one extra row is fetched to know if there is a next page
+        reviews = select_reviews(con, conditions + dated, params, page_size + 1)
+    # then those without one, only read once the dated reviews have run out
+    if len(reviews) <= page_size:
+        undated = [UNDATED] if position is None or position[0] is not None else [UNDATED, AFTER]
+        reviews += select_reviews(con, conditions + undated, params, page_size + 1 - len(reviews))
+    next_cursor = encode_cursor(reviews[page_size - 1]) if len(reviews) > page_size else None
+    return reviews[:page_size], next_cursor
+
+
+# the newest rating and the number of ratings of a food, or of every food when food_id is None,
+# which together change whenever a review is added, and when any user last changed, since reviews
+# show the name and picture of their reviewer
+def rating_version(con, food_id=None):
+    if food_id is None:
+        row = con.execute(text('select (select max(timestamp) from rating) as last_rated, '
+                               '(select coalesce(sum(rating_count), 0) from food_rating_stats) as rating_count, '
+                               '(select max(updated_at) from user) as users_changed')).first()
+    else:
+        row = con.execute(text('select max(timestamp) as last_rated, count(*) as rating_count, '
+                               '(select max(updated_at) from user) as users_changed '
+                               'from rating where food_id = :food_id'), food_id=food_id).first()
+    return row['last_rated'], row['rating_count'], row['users_changed']
@@ -1,18 +1,16 @@
-from flask import render_template, url_for, flash, redirect, request, Blueprint
+from flask import render_template, url_for, flash, redirect, request, Blueprint, current_app, send_from_directory
 from flask_login import login_user, current_user, logout_user, login_required
-from sqlalchemy import create_engine
 
-from dineinhall import db, bcrypt
-from dineinhall.config import Config
+from dineinhall import db, password_hasher, picture_pipeline, user_cache
+from dineinhall.database import connect
+from dineinhall.images import PICTURE_MAX_AGE
 from dineinhall.models import User
+from dineinhall.reviews.utils import fetch_review_page
 from dineinhall.users.forms import (RegistrationForm, LoginForm, UpdateAccountForm, RequestResetForm, ResetPasswordForm)
 from dineinhall.users.utils import save_picture, send_reset_email
 
 users = Blueprint('users', __name__)
 
-# allows us to recreate SQL query statements in Python
-engine = create_engine(Config.SQLALCHEMY_DATABASE_URI)
-
 
 # register page where the new users can register for an account given the right validated credentials
 @users.route("/register", methods=['GET', 'POST'])
@@ -25,7 +23,7 @@ def register():
     # checks if the user put in valid informaton to register for an account
     if form.validate_on_submit():
         # hashes password to store in database
-        hashed_password = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
+        hashed_password = password_hasher.hash(form.password.data)
         # get user object
         user = User(user_name=form.username.data, email=form.email.data, password=hashed_password)
         # add user to database
@@ -48,7 +46,11 @@ def login():
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
         # checks if decrypted password matches the password stored for the user in the database
-        if user and bcrypt.check_password_hash(user.password, form.password.data):
+        if user and password_hasher.check(user.password, form.password.data):
+            # hashes made with an older cost factor are replaced while the password is at hand
+            if password_hasher.needs_rehash(user.password):
+                user.password = password_hasher.hash(form.password.data)
+                db.session.commit()
             login_user(user, remember=form.remember.data)
             next_page = request.args.get('next')
             # redirect user to the page they were previously on else redirect to the home page
@@ -80,36 +82,41 @@ def account():
         current_user.user_name = form.username.data
         current_user.email = form.email.data
         db.session.commit()
+        user_cache.invalidate(current_user.user_id)
         flash('Your account has been updated!', 'success')
         return redirect(url_for('users.account'))
     elif request.method == 'GET':
         form.username.data = current_user.user_name
         form.email.data = current_user.email
-    image_file = url_for('static', filename='profile_pics/default.jpg')
-    return render_template('account.html', title='Account',
-                           image_file=image_file, form=form)
+    return render_template('account.html', title='Account', form=form)
+
+
+# serves a processed profile picture, its url changes whenever the picture does so browsers keep it for a year
+@users.route("/profile_pics/<key>/<name>")
+def profile_picture(key, name):
+    response = send_from_directory(picture_pipeline.directory, f'{key[:2]}/{key}/{name}', max_age=PICTURE_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 
 # shows all reviews/ratings for the specified user
 @users.route("/user/<string:username>")
 def user_reviews(username):
-    with engine.connect() as con:
-        # filters out the review from just the given username
+    with connect() as con:
+        # filters out one page of the reviews from just the given username
         # and a description exists
-        reviews = con.execute("select * "
-                              f"from food join rating using (food_id) "
-                              f"join user using (user_id) "
-                              f"where not isnull(description) and user_name='{username}' "
-                              f"order by timestamp desc")
-    reviews = list(reviews)
+        reviews, next_cursor = fetch_review_page(con, ['user.user_name = :user_name'], {'user_name': username},
+                                                 cursor=request.args.get('before'),
+                                                 page_size=current_app.config['REVIEWS_PAGE_SIZE'])
     size = len(reviews)
 
     # determining message displayed after a search
     if size == 0:
         flash('No reviews from this user', 'danger')
     else:
-        flash(f'Found {size} reviews!', 'success')
-    return render_template('reviews.html', title='Ratings', reviews=reviews)
+        flash(f'Showing {size} reviews!', 'success')
+    return render_template('reviews.html', title='Ratings', reviews=reviews, next_cursor=next_cursor)
 
 
 # allows users to request a password reset
@@ -146,9 +153,10 @@ def reset_token(token):
     # if the form has been submitted succesfully
     if form.validate_on_submit():
         # hash the users password to store in database
-        hashed_password = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
+        hashed_password = password_hasher.hash(form.password.data)
         user.password = hashed_password
         db.session.commit()
+        user_cache.invalidate(user.user_id)
         flash('Your password has been updated! You are now able to log in', 'success')
         return redirect(url_for('users.login'))
     return render_template('reset_token.html', title='Reset Password', form=form)
@@ -1,23 +1,22 @@
-import os
-import secrets
-from PIL import Image
-from flask import url_for, current_app
+from flask import url_for
 from flask_mail import Message
-from dineinhall import mail
+from sqlalchemy import text
+from dineinhall import mail_queue, picture_pipeline
+from dineinhall.database import begin
 
 
+# hands the upload to the picture pipeline and returns the key to store on the user
 def save_picture(form_picture):
-    random_hex = secrets.token_hex(8)
-    _, f_ext = os.path.splitext(form_picture.filename)
-    picture_fn = random_hex + f_ext
-    picture_path = os.path.join(current_app.root_path, 'static/profile_pics', picture_fn)
+    return picture_pipeline.submit(form_picture, on_ready=picture_ready)
 
-    output_size = (125, 125)
-    i = Image.open(form_picture)
-    i.thumbnail(output_size)
-    i.save(picture_path)
 
-    return picture_fn
+# pages showing the user were versioned by updated_at when the upload was committed, before its
+# variants existed, so it is moved forward (by at least a second, the column has no fractions)
+# for those pages to stop showing the default picture
+def picture_ready(key):
+    with begin() as con:
+        con.execute(text('update user set updated_at = greatest(utc_timestamp(), updated_at + interval 1 second) '
+                         'where profile_pic = :key'), key=key)
 
 
 def send_reset_email(user):
@@ -30,4 +29,5 @@ def send_reset_email(user):
 
 If you did not make this request then simply ignore this email and no changes will be made.
 '''
-    mail.send(msg)
+    # delivered in the background so the request does not wait on SMTP
+    mail_queue.send(msg)
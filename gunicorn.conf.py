@@ -0,0 +1,30 @@
+import os
+
+# Settings for `gunicorn run:app`, picked up from the working directory.
+# With preloading the app is created once in the master and workers are forked from it,
+# so imports, configuration and template compilation are not repeated in every worker.
+
+preload_app = os.environ.get("GUNICORN_PRELOAD", "true").lower() == "true"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+
+# "gevent" serves many requests per worker, each one yields while it waits on MySQL or SMTP
+# (pymysql is pure python so its sockets become cooperative once patched)
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "sync")
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 100))
+
+if worker_class == "gevent":
+    # patch before the preloaded app is imported so its locks and sockets are cooperative too
+    from gevent import monkey
+    monkey.patch_all()
+
+if preload_app:
+    os.environ.setdefault("PRECOMPILE_TEMPLATES", "true")
+
+
+# connections must never be shared across processes, each worker starts with an empty pool
+# (the redis client used by the menu cache already resets its pool when it sees a new pid)
+def post_fork(server, worker):
+    if not server.cfg.preload_app:
+        return
+    from dineinhall.database import dispose_engine
+    dispose_engine(worker.app.wsgi())
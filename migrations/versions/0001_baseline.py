@@ -0,0 +1,91 @@
+"""baseline schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+# the schema as it existed before migrations, existing databases are stamped with this revision
+def upgrade():
+    op.create_table('user',
+                    sa.Column('user_id', sa.Integer(), nullable=False),
+                    sa.Column('user_name', sa.String(length=20), nullable=False),
+                    sa.Column('email', sa.String(length=120), nullable=False),
+                    sa.Column('profile_pic', sa.String(length=20), nullable=False),
+                    sa.Column('password', sa.String(length=60), nullable=False),
+                    sa.PrimaryKeyConstraint('user_id'),
+                    sa.UniqueConstraint('user_name'),
+                    sa.UniqueConstraint('email'))
+    op.create_table('food',
+                    sa.Column('food_id', sa.Integer(), nullable=False),
+                    sa.Column('food_name', sa.String(length=100), nullable=True),
+                    sa.Column('serving', sa.Integer(), nullable=True),
+                    sa.Column('calories', sa.Integer(), nullable=True),
+                    sa.Column('calories_from_fat', sa.Integer(), nullable=True),
+                    sa.Column('cholesterol', sa.Integer(), nullable=True),
+                    sa.Column('dietary_fiber', sa.Integer(), nullable=True),
+                    sa.Column('protein', sa.Integer(), nullable=True),
+                    sa.Column('saturated_fat', sa.Integer(), nullable=True),
+                    sa.Column('sodium', sa.Integer(), nullable=True),
+                    sa.Column('sugar', sa.Integer(), nullable=True),
+                    sa.Column('total_carbs', sa.Integer(), nullable=True),
+                    sa.Column('total_fat', sa.Integer(), nullable=True),
+                    sa.Column('trans_fat', sa.Integer(), nullable=True),
+                    sa.Column('vitamin_d', sa.Integer(), nullable=True),
+                    sa.Column('vegetarian', sa.Boolean(), nullable=False),
+                    sa.Column('vegan', sa.Boolean(), nullable=False),
+                    sa.Column('balanced', sa.Boolean(), nullable=False),
+                    sa.Column('description', sa.Text(), nullable=True),
+                    sa.PrimaryKeyConstraint('food_id'))
+    op.create_table('menu',
+                    sa.Column('menu_id', sa.Integer(), nullable=False),
+                    sa.Column('meal_type', sa.Enum('breakfast', 'lunch', 'dinner'), nullable=False),
+                    sa.Column('location', sa.Enum('Stwest', 'Steast', 'IV'), nullable=True),
+                    sa.Column('menu_date', sa.DateTime(), nullable=True),
+                    sa.PrimaryKeyConstraint('menu_id'))
+    op.create_table('food_on_menu',
+                    sa.Column('food_id', sa.Integer(), nullable=False),
+                    sa.Column('menu_id', sa.Integer(), nullable=False),
+                    sa.ForeignKeyConstraint(['food_id'], ['food.food_id']),
+                    sa.ForeignKeyConstraint(['menu_id'], ['menu.menu_id']),
+                    sa.PrimaryKeyConstraint('food_id', 'menu_id'))
+    op.create_table('rating',
+                    sa.Column('user_id', sa.Integer(), nullable=False),
+                    sa.Column('food_id', sa.Integer(), nullable=False),
+                    sa.Column('stars', sa.Integer(), nullable=False),
+                    sa.Column('description', sa.String(length=300), nullable=True),
+                    sa.Column('timestamp', sa.DateTime(), nullable=True),
+                    sa.ForeignKeyConstraint(['food_id'], ['food.food_id']),
+                    sa.ForeignKeyConstraint(['user_id'], ['user.user_id']),
+                    sa.PrimaryKeyConstraint('user_id', 'food_id'))
+    op.create_table('allergen',
+                    sa.Column('allergen_id', sa.Integer(), nullable=False),
+                    sa.Column('allergen_name', sa.String(length=100), nullable=True),
+                    sa.PrimaryKeyConstraint('allergen_id'))
+    op.create_table('food_on_allergen',
+                    sa.Column('food_id', sa.Integer(), nullable=False),
+                    sa.Column('allergen_id', sa.Integer(), nullable=False),
+                    sa.ForeignKeyConstraint(['food_id'], ['food.food_id']),
+                    sa.ForeignKeyConstraint(['allergen_id'], ['allergen.allergen_id']),
+                    sa.PrimaryKeyConstraint('food_id', 'allergen_id'))
+
+
+def downgrade():
+    op.drop_table('food_on_allergen')
+    op.drop_table('allergen')
+    op.drop_table('rating')
+    op.drop_table('food_on_menu')
+    op.drop_table('menu')
+    op.drop_table('food')
+    op.drop_table('user')
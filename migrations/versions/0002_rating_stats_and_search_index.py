@@ -0,0 +1,43 @@
+"""food rating aggregates and food name full-text index
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 10:05:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('food_rating_stats',
+                    sa.Column('food_id', sa.Integer(), nullable=False),
+                    sa.Column('rating_count', sa.Integer(), nullable=False),
+                    sa.Column('rating_sum', sa.Integer(), nullable=False),
+                    sa.Column('average', sa.Numeric(precision=3, scale=2), nullable=True),
+                    sa.Column('stars_1', sa.Integer(), nullable=False),
+                    sa.Column('stars_2', sa.Integer(), nullable=False),
+                    sa.Column('stars_3', sa.Integer(), nullable=False),
+                    sa.Column('stars_4', sa.Integer(), nullable=False),
+                    sa.Column('stars_5', sa.Integer(), nullable=False),
+                    sa.ForeignKeyConstraint(['food_id'], ['food.food_id']),
+                    sa.PrimaryKeyConstraint('food_id'))
+    # fill the aggregates from the ratings submitted so far
+    op.execute('insert into food_rating_stats '
+               '(food_id, rating_count, rating_sum, average, stars_1, stars_2, stars_3, stars_4, stars_5) '
+               'select food_id, count(*), sum(stars), round(avg(stars), 2), sum(stars = 1), '
+               'sum(stars = 2), sum(stars = 3), sum(stars = 4), sum(stars = 5) '
+               'from rating group by food_id')
+    op.create_index('ft_food_name_description', 'food', ['food_name', 'description'], mysql_prefix='FULLTEXT')
+
+
+def downgrade():
+    op.drop_index('ft_food_name_description', table_name='food')
+    op.drop_table('food_rating_stats')
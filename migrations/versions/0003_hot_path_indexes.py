@@ -0,0 +1,33 @@
+"""indexes for the menu, search and review queries
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 10:10:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # menu page filters on (menu_date, location) and search on (menu_date, location in, meal_type)
+    op.create_index('ix_menu_date_location_meal', 'menu', ['menu_date', 'location', 'meal_type'])
+    # menu -> food_on_menu joins look up by menu_id, the primary key starts with food_id
+    op.create_index('ix_food_on_menu_menu_food', 'food_on_menu', ['menu_id', 'food_id'])
+    # all reviews are listed newest first
+    op.create_index('ix_rating_timestamp', 'rating', ['timestamp'])
+    # reviews of one food are listed newest first
+    op.create_index('ix_rating_food_timestamp', 'rating', ['food_id', 'timestamp'])
+
+
+def downgrade():
+    op.drop_index('ix_rating_food_timestamp', table_name='rating')
+    op.drop_index('ix_rating_timestamp', table_name='rating')
+    op.drop_index('ix_food_on_menu_menu_food', table_name='food_on_menu')
+    op.drop_index('ix_menu_date_location_meal', table_name='menu')
@@ -0,0 +1,32 @@
+"""indexes matching the keyset ordering of the reviews pages
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 10:15:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+# reviews are paged on (timestamp, user_id, food_id) so the indexes carry the whole cursor
+def upgrade():
+    op.create_index('ix_rating_keyset', 'rating', ['timestamp', 'user_id', 'food_id'])
+    op.create_index('ix_rating_food_keyset', 'rating', ['food_id', 'timestamp', 'user_id'])
+    op.create_index('ix_rating_user_keyset', 'rating', ['user_id', 'timestamp', 'food_id'])
+    op.drop_index('ix_rating_food_timestamp', table_name='rating')
+    op.drop_index('ix_rating_timestamp', table_name='rating')
+
+
+def downgrade():
+    op.create_index('ix_rating_timestamp', 'rating', ['timestamp'])
+    op.create_index('ix_rating_food_timestamp', 'rating', ['food_id', 'timestamp'])
+    op.drop_index('ix_rating_user_keyset', table_name='rating')
+    op.drop_index('ix_rating_food_keyset', table_name='rating')
+    op.drop_index('ix_rating_keyset', table_name='rating')
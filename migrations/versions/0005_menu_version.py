@@ -0,0 +1,32 @@
+"""when the menus of each location and day last changed
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 10:20:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('menu_version',
+                    sa.Column('menu_date', sa.Date(), nullable=False),
+                    sa.Column('location', sa.Enum('Stwest', 'Steast', 'IV'), nullable=False),
+                    sa.Column('scraped_at', sa.DateTime(), nullable=False),
+                    sa.PrimaryKeyConstraint('menu_date', 'location'))
+    # menus scraped so far all start at the same version
+    op.execute('insert into menu_version (menu_date, location, scraped_at) '
+               'select distinct date(menu_date), location, utc_timestamp() from menu '
+               'where menu_date is not null and location is not null')
+
+
+def downgrade():
+    op.drop_table('menu_version')
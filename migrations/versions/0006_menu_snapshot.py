@@ -0,0 +1,31 @@
+"""denormalized snapshots of the foods on each menu
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 10:25:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+# snapshots are filled by the scraper, or for days already scraped with `flask main rebuild-menu-snapshots`
+def upgrade():
+    op.create_table('menu_snapshot',
+                    sa.Column('menu_date', sa.Date(), nullable=False),
+                    sa.Column('location', sa.Enum('Stwest', 'Steast', 'IV'), nullable=False),
+                    sa.Column('meal_type', sa.Enum('breakfast', 'lunch', 'dinner'), nullable=False),
+                    sa.Column('items', sa.Text(length=16777215), nullable=False),
+                    sa.Column('built_at', sa.DateTime(), nullable=False),
+                    sa.PrimaryKeyConstraint('menu_date', 'location', 'meal_type'))
+
+
+def downgrade():
+    op.drop_table('menu_snapshot')
@@ -0,0 +1,28 @@
+"""when each user last changed, the version of the reviewer names and pictures on review pages
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 14:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('user', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    # existing users all start at the same version
+    op.execute('update user set updated_at = utc_timestamp()')
+    op.create_index('ix_user_updated_at', 'user', ['updated_at'])
+
+
+def downgrade():
+    op.drop_index('ix_user_updated_at', table_name='user')
+    op.drop_column('user', 'updated_at')
@@ -1,66 +1,55 @@
-from sqlalchemy import create_engine
+import argparse
 import datetime as dt
 from datetime import datetime
 from pytz import timezone
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from decimal import Decimal
+from urllib.parse import urlsplit, urlencode
+import hashlib
+import http.client
+import ijson
 import json
-import urllib.request
 import os
+import re
 import sys
-from dineinhall.config import Config
+import threading
+import time
+from sqlalchemy import text
+from dineinhall import create_app, menu_cache
+from dineinhall.catalog import FoodRecord, FOOD_COLUMNS, NUTRIENT_FIELDS
+from dineinhall.database import connect, begin
+from dineinhall.menus import build_snapshots, compact_snapshots
 
 # give access to the parent directory to run independently
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'dineinhall'))
 
-# allows us to recreate SQL query statements in Python
-engine = create_engine(Config.SQLALCHEMY_DATABASE_URI)
+# location IDs for the API
+LOCATION_IDS = {'Stwest': "5b9bd1c41178e90d4774210e",
+                'IV': "586d17503191a27120e60dec",
+                'Steast': "586d05e4ee596f6e6c04b527"}
+
+
+# hashable key of a menu, dates from the database come back as datetimes
+def menuKey(mealType, location, menuDate):
+    if isinstance(menuDate, datetime):
+        menuDate = menuDate.date()
+    return (mealType, location, menuDate)
 
 
 class Utils():
 
-    # fetches any field from the last row of the database
-    def fetchLastField(self, field):
-        with engine.connect() as con:
-            rs = con.execute(f'select distinct {field} '
-                             'from food left join food_on_menu using (food_id) '
-                             'left join menu using (menu_id) '
-                             'left join food_on_allergen using (food_id) '
-                             'left join allergen using (allergen_id) '
-                             f'order by {field} desc '
-                             'limit 1')
-        # returns the first item in the row
-        try:
-            item = list(rs)[0][0]
-            return item if item is not None else 0
-        except IndexError:
-            return 0
-
-    # creates a list of dictionaries with any variable amount of fields for the dictionary
-    def createCombinations(self, *args):
-        final_list = []
-        with engine.connect() as con:
-            rs = con.execute(f'select distinct * '
-                             'from food left join food_on_menu using (food_id) '
-                             'left join menu using (menu_id) '
-                             'left join food_on_allergen using (food_id) '
-                             'left join allergen using (allergen_id)')
-            # for each row in the result
-            for row in rs:
-                dict = {}
-                # create a key value pair for each columnn
-                for column in args:
-                    dict[column] = row[column]
-                # to avoid filler data
-                if not all(value is None for value in dict.values()):
-                    final_list.append(dict)
-        return final_list
-
-    def cleanStringNames(self, foodName):
-        foodName.strip()
-        # replace % with %% to insert into SQL queries
-        foodName = foodName.replace("%", r"%%")
-        # escape apostrophes to insert into SQL queries
-        foodName = foodName.replace('"', r"\"")
-        return foodName
+    # fetches the largest id in a table, or 0 if the table is empty
+    def fetchMaxID(self, table, field):
+        with connect() as con:
+            item = con.execute(f'select max({field}) from {table}').scalar()
+        return item if item is not None else 0
+
+    # fetches only the given columns of a table as a list of rows
+    def fetchColumns(self, table, *columns):
+        with connect() as con:
+            rs = con.execute(f"select {', '.join(columns)} from {table}")
+            return list(rs)
 
     def cleanNutrientName(self, nutrientName):
         # remove everything after the first parentheses and strip white space
@@ -72,239 +61,565 @@ class Utils():
             nutrientName = 'total_carbs'
         return nutrientName
 
-    # strips the nutrient information of all characters except digits and decimals
-    def stripNutrient(self, element):
-        result = ''.join(c for c in str(element) if c.isdigit() or c == '.')
-        # returns a null if the value does not exist else return the result
-        return 'NULL' if result == '' else result
+
+# characters removed from nutrient values, everything except digits and decimals
+NON_NUMERIC = re.compile(r'[^\d.]')
+
+# column of each nutrient name from the API, filled in as new names are seen
+NUTRIENT_COLUMNS = {}
+
+
+def nutrientColumn(nutrientName):
+    column = NUTRIENT_COLUMNS.get(nutrientName)
+    if column is None:
+        column = NUTRIENT_COLUMNS[nutrientName] = Utils().cleanNutrientName(nutrientName)
+    return column
+
+
+# converts a column of raw nutrient values to numbers, None where the value does not exist
+def toNumbers(values):
+    numbers = []
+    for value in values:
+        if isinstance(value, (int, float, Decimal)):
+            number = float(value)
+        else:
+            try:
+                number = float(NON_NUMERIC.sub('', str(value)))
+            except ValueError:
+                number = None
+        # whole numbers are stored as integers
+        numbers.append(int(number) if number is not None and number.is_integer() else number)
+    return numbers
+
+
+# statuses worth asking again for after a pause, any other error status means the day is skipped
+RETRY_STATUSES = {429}
+# returned by Fetcher.fetch for a day the API refused, nothing about it is cached or ingested
+SKIPPED = 'skipped'
+
+# bytes read from a response at a time
+CHUNK_SIZE = 64 * 1024
+
+# JSON path of the food items within a menu response
+ITEM_PREFIX = 'menu.periods.item.categories.item.items.item'
+
+
+# Parses a menu response incrementally, only one food item is built in memory at a time
+class MenuReader():
+    def __init__(self, path):
+        self.path = path
+        self.status = None
+
+    # yields the meal type and the food of every item in the menu
+    def items(self):
+        mealType = None
+        builder = None
+        with open(self.path, 'rb') as f:
+            for prefix, event, value in ijson.parse(f):
+                if builder is not None:
+                    builder.event(event, value)
+                    # the item is complete once its own object closes
+                    if prefix == ITEM_PREFIX and event == 'end_map':
+                        yield mealType, builder.value
+                        builder = None
+                elif prefix == ITEM_PREFIX and event == 'start_map':
+                    builder = ijson.ObjectBuilder()
+                    builder.event(event, value)
+                elif prefix == 'menu.periods.item.name':
+                    mealType = value  # meal type
+                elif prefix == 'status':
+                    self.status = value
+                    # a failed payload has no menu worth reading
+                    if value != 'success':
+                        return
+
+
+# Keeps the last API response for each (location ID, date) on disk along with its validators,
+# a hash of its content and whether it has been ingested. Files are named like the ones
+# scraping/stubServer.py serves, so a cache directory can be replayed by the stub server.
+class ResponseCache():
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def bodyPath(self, locationID, date):
+        return os.path.join(self.directory, f'{locationID}_{date}.json')
+
+    def metaPath(self, locationID, date):
+        return os.path.join(self.directory, f'{locationID}_{date}.meta')
+
+    # the validators and content hash of the cached response, empty if nothing is cached
+    def loadMeta(self, locationID, date):
+        try:
+            with open(self.metaPath(locationID, date)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def saveMeta(self, locationID, date, meta):
+        path = self.metaPath(locationID, date)
+        # write then rename so a crash never leaves a half written file behind
+        with open(path + '.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(path + '.tmp', path)
+
+    # path of the cached body if one exists
+    def findBody(self, locationID, date):
+        path = self.bodyPath(locationID, date)
+        return path if os.path.isfile(path) else None
+
+    # records that the cached response for the day has been written to the database
+    def markIngested(self, locationID, date):
+        meta = self.loadMeta(locationID, date)
+        if meta:
+            meta['ingested'] = True
+            self.saveMeta(locationID, date, meta)
+
+
+class Fetcher():
+    def __init__(self, apiURL, siteID, concurrency=6, timeout=15, retries=3, backoff=0.5, cache=None, offline=False):
+        url = urlsplit(apiURL)
+        self.scheme = url.scheme
+        self.host = url.netloc
+        self.path = url.path
+        self.siteID = siteID
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        # responses kept on disk, offline mode only replays them without any requests
+        self.cache = cache
+        self.offline = offline
+        # each thread keeps its own connection open between requests
+        self.local = threading.local()
+
+    def getConnection(self):
+        con = getattr(self.local, 'con', None)
+        if con is None:
+            if self.scheme == 'https':
+                con = http.client.HTTPSConnection(self.host, timeout=self.timeout)
+            else:
+                con = http.client.HTTPConnection(self.host, timeout=self.timeout)
+            self.local.con = con
+        return con
+
+    def closeConnection(self):
+        con = getattr(self.local, 'con', None)
+        if con is not None:
+            con.close()
+            self.local.con = None
+
+    # downloads the menu of a location for a date into the cache, retrying failed requests with exponential backoff
+    # returns a reader over the cached menu, None when it has not changed since it was last ingested,
+    # or SKIPPED when the API answered with an error that retrying will not fix or still failed after the retries
+    def fetch(self, locationID, date):
+        if self.offline:
+            path = self.cache.findBody(locationID, date)
+            return MenuReader(path) if path is not None else None
+        meta = self.cache.loadMeta(locationID, date)
+        path = self.cache.bodyPath(locationID, date)
+        # validators are only worth sending while the body they describe is still on disk
+        if self.cache.findBody(locationID, date) is None:
+            meta = {}
+        headers = {'Connection': 'keep-alive'}
+        # let the API answer 304 Not Modified if it supports validators
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        try:
+            status, responseHeaders, digest = self.request(locationID, date, headers, path + '.part')
+        except (OSError, http.client.HTTPException) as error:
+            # one unreachable day must not stop the other days from being ingested
+            print(f"Skipping location {locationID} on {date} after {self.retries + 1} attempts: {error}")
+            return SKIPPED
+        conditional = 'If-None-Match' in headers or 'If-Modified-Since' in headers
+        if status not in (200, 304) or (status == 304 and not conditional):
+            # an error page is not a menu, it is neither cached nor parsed
+            os.remove(path + '.part')
+            print(f"Skipping location {locationID} on {date}: the API answered {status}")
+            return SKIPPED
+        if status == 304:
+            os.remove(path + '.part')
+            # the body may have been pruned since the request was sent, ask again without validators
+            if self.cache.findBody(locationID, date) is None:
+                return self.fetch(locationID, date)
+            return MenuReader(path) if not meta.get('ingested') else None
+        # the same content as last time is skipped once it has been ingested
+        if digest == meta.get('sha256') and meta.get('ingested'):
+            os.remove(path + '.part')
+            return None
+        os.replace(path + '.part', path)
+        self.cache.saveMeta(locationID, date, {'etag': responseHeaders.get('ETag'),
+                                               'last_modified': responseHeaders.get('Last-Modified'),
+                                               'sha256': digest, 'ingested': False})
+        return MenuReader(path)
+
+    # sends a GET request for the menu and streams the body of the response to the given file
+    # returns the status, the headers and a hash of the body
+    def request(self, locationID, date, headers, path):
+        query = urlencode({'site_id': self.siteID, 'platform': 0, 'location_id': locationID, 'date': date})
+        for attempt in range(self.retries + 1):
+            try:
+                con = self.getConnection()
+                con.request('GET', f'{self.path}?{query}', headers=headers)
+                response = con.getresponse()
+                digest = hashlib.sha256()
+                # never hold more than one chunk of the body in memory
+                with open(path, 'wb') as f:
+                    for chunk in iter(lambda: response.read(CHUNK_SIZE), b''):
+                        digest.update(chunk)
+                        f.write(chunk)
+                if response.status < 500 and response.status not in RETRY_STATUSES:
+                    return response.status, response.headers, digest.hexdigest()
+                error = http.client.HTTPException(f'{response.status} {response.reason}')
+                os.remove(path)
+            except (OSError, http.client.HTTPException) as e:
+                error = e
+                # a partly streamed body is never kept
+                if os.path.exists(path):
+                    os.remove(path)
+            # start over with a new connection after any failure
+            self.closeConnection()
+            if attempt < self.retries:
+                time.sleep(self.backoff * 2 ** attempt)
+        raise error
+
+    # downloads every (location ID, date) pair concurrently
+    # results come back in the same order as the pairs regardless of which finishes first
+    def fetchAll(self, pairs):
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            return list(executor.map(lambda pair: self.fetch(*pair), pairs))
+
+
+# turns the items of a menu into (meal type, food record, allergens) without touching the database
+def parseDay(reader):
+    items = []
+    # raw nutrient values of the whole day, by column and then by item
+    rawNutrients = {}
+    # for each food item of each meal type (breakfast, lunch, dinner)
+    for mealType, food in reader.items():
+        foodData = {}
+
+        foodName = food['name'].strip()
+        foodData['food_name'] = foodName
+
+        foodData['description'] = food['desc']
+
+        allergens = []
+        filters = food['filters']  # array
+        # if no filters exist default the values to false
+        if len(filters) == 0:
+            foodData['vegetarian'] = False
+            foodData['vegan'] = False
+            foodData['balanced'] = False
+        for filt in filters:
+            filterName = filt['name']
+            filterType = filt['type']
+            if filterType == 'allergen':
+                allergens.append(sys.intern(filterName.strip('*')))
+            foodData['vegetarian'] = (filterName == 'Vegetarian'
+                                      or foodData.get('vegetarian', False))
+            foodData['vegan'] = (filterName == 'Vegan'
+                                 or foodData.get('vegan', False))
+            foodData['balanced'] = (filterName == 'Balanced U'
+                                    or foodData.get('balanced', False))
+
+        # nutrients are collected now and converted for the whole day at once below
+        index = len(items)
+        rawNutrients.setdefault('calories', {})[index] = food['calories']
+        for nutrient in food['nutrients']:  # array
+            # nutrientUOM = nutrient['uom']
+            column = nutrientColumn(nutrient['name'])
+            # nutrients without a column in the food table are not kept
+            if column in NUTRIENT_FIELDS:
+                rawNutrients.setdefault(column, {})[index] = nutrient['value']
+
+        portion = food['portion']
+        foodData['serving'] = portion
+
+        items.append((mealType, FoodRecord(**foodData), allergens))
+
+    # like the API's own status, only successful payloads are ingested even when the status comes after the menu
+    if reader.status != 'success':
+        return [], reader.status
+
+    # convert each nutrient column in a single pass
+    for column, values in rawNutrients.items():
+        for index, number in zip(values.keys(), toNumbers(values.values())):
+            setattr(items[index][1], column, number)
+    return items, reader.status
+
+
+# parses one fetched day and times it, runs in a worker process when scraping in parallel
+def parseFetched(reader):
+    if reader is None or reader is SKIPPED:
+        return None, reader, 0.0
+    start = time.perf_counter()
+    items, status = parseDay(reader)
+    return items, status, time.perf_counter() - start
+
+
+# parses the fetched days in order, in worker processes when there is more than one
+# only a few days are parsed ahead of the one being diffed so memory stays bounded
+def parseDays(readers, workers):
+    if workers <= 1:
+        yield from map(parseFetched, readers)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for reader in readers:
+            if isinstance(reader, MenuReader):
+                pending.append(executor.submit(parseFetched, reader))
+            else:
+                # days with nothing to parse stay here, SKIPPED would not be itself anymore once pickled
+                pending.append(completed(parseFetched(reader)))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def completed(result):
+    future = Future()
+    future.set_result(result)
+    return future
 
 
 class Scraper():
-    def __init__(self):
-        # location IDs for the API
-        self.stwestID = "5b9bd1c41178e90d4774210e"
-        self.steastID = "586d05e4ee596f6e6c04b527"
-        self.ivID = "586d17503191a27120e60dec"
-        self.locations = ['Stwest', 'IV', 'Steast']
-        self.locationIDs = [self.stwestID, self.ivID, self.steastID]
+    def __init__(self, config):
+        # settings to build a fetcher with, also passed to worker processes
+        self.fetcherSettings = {'apiURL': config['SCRAPER_API_URL'], 'siteID': config['SCRAPER_SITE_ID'],
+                                'concurrency': config['SCRAPER_CONCURRENCY'], 'timeout': config['SCRAPER_TIMEOUT'],
+                                'retries': config['SCRAPER_RETRIES'], 'backoff': config['SCRAPER_BACKOFF'],
+                                'cache': ResponseCache(config['SCRAPER_CACHE_DIR']),
+                                'offline': config['SCRAPER_OFFLINE']}
+        self.cache = self.fetcherSettings['cache']
+        # seconds spent in each stage of the scrape
+        self.timings = {'bootstrap': 0.0, 'fetch': 0.0, 'parse': 0.0, 'diff': 0.0, 'insert': 0.0}
+        start = time.perf_counter()
+        # days fetched in this run whose responses get marked as ingested after the insert commits
+        self.fetchedDays = []
+        # number of rows sent per insert statement
+        self.batchSize = config['SCRAPER_BATCH_SIZE']
+        self.snapshotRetention = config['MENU_SNAPSHOT_RETENTION_DAYS']
         # sets each variable to the last known id
-        self.foodID = Utils().fetchLastField('food_id')
-        self.menuID = Utils().fetchLastField('menu_id')
-        self.allergenID = Utils().fetchLastField('allergen_id')
+        self.foodID = Utils().fetchMaxID('food', 'food_id')
+        self.menuID = Utils().fetchMaxID('menu', 'menu_id')
+        self.allergenID = Utils().fetchMaxID('allergen', 'allergen_id')
         print("Food ID:", self.foodID, "Menu ID:", self.menuID, "Allergen ID:", self.allergenID)
-        # creates a list of dictionaries with the given attributes
-        self.uniqueFoods = Utils().createCombinations('food_id', 'food_name')
-        self.uniqueMenus = Utils().createCombinations('meal_type', 'location', 'menu_date')
-        self.uniqueMenuFoodCombos = Utils().createCombinations('menu_id', 'food_id')
-        self.uniqueAllergens = Utils().createCombinations('allergen_id', 'allergen_name')
-        self.uniqueFoodAlergenCombos = Utils().createCombinations('food_id', 'allergen_id')
-        # lists to keep track of new data
+        # hashed indexes of the existing data so lookups do not depend on the size of the database
+        self.foodIDs = {row.food_name: row.food_id for row in Utils().fetchColumns('food', 'food_id', 'food_name')}
+        self.menuIDs = {menuKey(row.meal_type, row.location, row.menu_date): row.menu_id
+                        for row in Utils().fetchColumns('menu', 'menu_id', 'meal_type', 'location', 'menu_date')}
+        self.allergenIDs = {row.allergen_name: row.allergen_id
+                            for row in Utils().fetchColumns('allergen', 'allergen_id', 'allergen_name')}
+        # food names are interned so each one is stored once however many indexes refer to it
+        self.foodIDs = {sys.intern(name): foodID for name, foodID in self.foodIDs.items()}
+        # foods on existing menus are only loaded for the menus that get scraped again
+        self.menuFoodCombos = set()
+        self.loadedMenus = set()
+        # allergens are only paired with new foods, so existing pairs never need to be loaded
+        self.foodAllergenCombos = set()
+        # lists to keep track of new data, foods as records and the other rows as tuples in column order
         self.newFoods = []
         self.newMenus = []
         self.newFoodMenuCombos = []
         self.newAllergens = []
         self.newFoodAllergenCombos = []
-
-    # get data from API
-    def getData(self, location, date):
-        location_id = self.locationIDs[self.locations.index(location)]
-        link = f"https://api.dineoncampus.com/v1/location/menu?site_id=5751fd2b90975b60e048929a&platform=0&location_id={location_id}&date={date}"
-        with urllib.request.urlopen(link) as url:
-            data = json.loads(url.read().decode())
-            if data['status'] == 'success':
-                menu = data['menu']  # type: dict
-
-                # for each meal type (breakfast, lunch, dinner)
-                for period in menu['periods']:
-                    mealType = period['name']  # meal type
-                    # for each category of the period
-                    for category in period['categories']:
-                        # categoryName = category['name']
-                        # for each food item in the category
-                        for food in category['items']:
-                            foodData = {}
-
-                            foodName = food['name'].strip()
-                            foodData['food_name'] = foodName
-
-                            calories = Utils().stripNutrient(food['calories'])
-                            foodData['calories'] = calories
-
-                            description = food['desc']
-                            foodData['description'] = f'"{description}"' if description is not None else 'NULL'
-
-                            allergens = []
-                            filters = food['filters']  # array
-                            # if no filters exist default the values to false
-                            if len(filters) == 0:
-                                foodData['vegetarian'] = False
-                                foodData['vegan'] = False
-                                foodData['balanced'] = False
-                            for filt in filters:
-                                filterName = filt['name']
-                                filterType = filt['type']
-                                if filterType == 'allergen':
-                                    allergens.append(filterName.strip('*'))
-                                foodData['vegetarian'] = (filterName == 'Vegetarian'
-                                                          or foodData.get('vegetarian', False))
-                                foodData['vegan'] = (filterName == 'Vegan'
-                                                     or foodData.get('vegan', False))
-                                foodData['balanced'] = (filterName == 'Balanced U'
-                                                        or foodData.get('balanced', False))
-
-                            nutrients = food['nutrients']  # array
-                            for nutrient in nutrients:
-                                nutrientName = nutrient['name']
-                                nutrientValue = nutrient['value']
-                                # nutrientUOM = nutrient['uom']
-                                foodData[Utils().cleanNutrientName(nutrientName)] = Utils().stripNutrient(nutrientValue)
-
-                            portion = food['portion']
-                            foodData['serving'] = portion
-
-                            existingAllergenNames = [d.get('allergen_name', None) for d in self.uniqueAllergens]
-                            for allergen in allergens:
-                                if allergen not in existingAllergenNames:
-                                    self.allergenID += 1
-                                    allergenDict = {'allergen_id': self.allergenID, 'allergen_name': allergen}
-                                    self.uniqueAllergens.append(allergenDict)
-                                    self.newAllergens.append(allergenDict)
-
-                            newMenuAttributes = {'meal_type': mealType, 'location': location, 'menu_date': datetime.date(datetime.strptime(date, '%Y-%m-%d'))}
-                            # if the menu is a new one
-                            if newMenuAttributes not in self.uniqueMenus:
-                                self.menuID += 1
-                                self.uniqueMenus.append(newMenuAttributes)
-                                fullMenuAttributes = newMenuAttributes.copy()
-                                fullMenuAttributes['menu_id'] = self.menuID
-                                self.newMenus.append(fullMenuAttributes)
-
-                            existingFoodNames = [d.get('food_name', None) for d in self.uniqueFoods]
-                            # if the food name is a new one
-                            if (foodData['food_name'] not in existingFoodNames):
-                                self.foodID += 1
-                                foodData['food_id'] = self.foodID
-                                self.newFoods.append(foodData)
-                                self.uniqueFoods.append(foodData)
-                                self.newFoodMenuCombos.append({'menu_id': self.menuID, 'food_id': self.foodID})
-                                existingAllergenNames = [d.get('allergen_name', None) for d in self.uniqueAllergens]
-                                for allergen in allergens:
-                                    dict = self.uniqueAllergens[existingAllergenNames.index(allergen)]
-                                    self.newFoodAllergenCombos.append({'food_id': self.foodID, 'allergen_id': dict['allergen_id']})
-                            # if the food name exists
-                            else:
-                                dict = self.uniqueFoods[existingFoodNames.index(foodData['food_name'])]
-                                # make a dictionary with the menuID and the foodID referencing the recorded food
-                                newMenuFoodCombo = {'menu_id': self.menuID, 'food_id': dict['food_id']}
-                                if newMenuFoodCombo not in self.uniqueMenuFoodCombos:
-                                    self.uniqueMenuFoodCombos.append(newMenuFoodCombo)
-                                    self.newFoodMenuCombos.append(newMenuFoodCombo)
-                print(f"Got data for {location} on {date}")
-            else:
-                print(f"No data found for {location} on {date}")
+        # (location, date) of the menus that gained foods, their version is bumped when inserted
+        self.changedDays = set()
+        self.timings['bootstrap'] += time.perf_counter() - start
+
+    # adds the parsed foods of a location and date to the new data, assigning IDs to anything new
+    def processDay(self, location, date, items, status):
+        menuDate = datetime.date(datetime.strptime(date, '%Y-%m-%d'))
+        if status == SKIPPED:
+            return
+        self.fetchedDays.append((LOCATION_IDS[location], date))
+        if items is None:
+            print(f"No new data for {location} on {date}")
+            return
+        for mealType, food, allergens in items:
+            for allergen in allergens:
+                if allergen not in self.allergenIDs:
+                    self.allergenID += 1
+                    self.allergenIDs[allergen] = self.allergenID
+                    self.newAllergens.append((self.allergenID, allergen))
+
+            key = menuKey(mealType, location, menuDate)
+            menuID = self.menuIDs.get(key)
+            # if the menu is a new one
+            if menuID is None:
+                self.menuID += 1
+                menuID = self.menuID
+                self.menuIDs[key] = menuID
+                self.loadedMenus.add(menuID)
+                self.newMenus.append((menuID, mealType, location, menuDate))
+            elif menuID not in self.loadedMenus:
+                self.loadMenuFoods(menuID)
+
+            foodID = self.foodIDs.get(food.food_name)
+            # if the food name is a new one
+            if foodID is None:
+                self.foodID += 1
+                foodID = self.foodID
+                food.food_id = foodID
+                self.foodIDs[sys.intern(food.food_name)] = foodID
+                self.newFoods.append(food)
+                for allergen in allergens:
+                    foodAllergenCombo = (foodID, self.allergenIDs[allergen])
+                    if foodAllergenCombo not in self.foodAllergenCombos:
+                        self.foodAllergenCombos.add(foodAllergenCombo)
+                        self.newFoodAllergenCombos.append(foodAllergenCombo)
+            # pair the menu with the new or already recorded food
+            if (menuID, foodID) not in self.menuFoodCombos:
+                self.menuFoodCombos.add((menuID, foodID))
+                self.newFoodMenuCombos.append((menuID, foodID))
+                self.changedDays.add((location, menuDate))
+        if status == 'success':
+            print(f"Got data for {location} on {date}")
+        else:
+            print(f"No data found for {location} on {date}")
+
+    # loads the foods already recorded on an existing menu
+    def loadMenuFoods(self, menuID):
+        with connect() as con:
+            rs = con.execute(text('select food_id from food_on_menu where menu_id = :menu_id'), menu_id=menuID)
+            self.menuFoodCombos.update((menuID, row.food_id) for row in rs)
+        self.loadedMenus.add(menuID)
+
+    # inserts rows (tuples in column order) with parameterized statements sent in batches of bounded size
+    # with ignoreDuplicates rows whose key already exists are left untouched so re-running an ingest is a no-op,
+    # which is only safe for the join tables: a food, menu or allergen ID allocated by this run that already
+    # exists means another run took it in the meantime, and the insert must fail rather than link to its rows
+    def insertRows(self, con, table, columns, rows, ignoreDuplicates=False):
+        statement = (f"insert into {table} ({', '.join(columns)}) "
+                     f"values ({', '.join(':' + column for column in columns)})")
+        if ignoreDuplicates:
+            statement += f' on duplicate key update {columns[0]} = {columns[0]}'
+        statement = text(statement)
+        for start in range(0, len(rows), self.batchSize):
+            con.execute(statement, [dict(zip(columns, row)) for row in rows[start:start + self.batchSize]])
 
     # insert data into food table
-    def insertFoodData(self):
-        if (len(self.newFoods) > 0):
-            foodValues = ""
-            for foodDict in self.newFoods:
-                foodName = Utils().cleanStringNames(foodDict['food_name'])
-                description = Utils().cleanStringNames(foodDict['description'])
-                serving = Utils().cleanStringNames(foodDict['serving'])
-                foodValues += (f'({foodDict["food_id"]}, "{foodName}", '
-                            f'"{serving}", {foodDict["calories"]}, '
-                            f'{foodDict["calories_from_fat"]}, {foodDict["cholesterol"]}, '
-                            f'{foodDict["dietary_fiber"]}, {foodDict["protein"]}, '
-                            f'{foodDict["saturated_fat"]}, {foodDict["sodium"]}, '
-                            f'{foodDict["sugar"]}, {foodDict["total_carbs"]}, '
-                            f'{foodDict["total_fat"]}, {foodDict["trans_fat"]}, '
-                            f'{foodDict["vitamin_d"]}, {foodDict["vegetarian"]}, '
-                            f'{foodDict["vegan"]}, {foodDict["balanced"]}, '
-                            f'"{description}"), \n')
-            foodValues = foodValues[:-3]
-            with engine.begin() as con:
-                con.execute("INSERT INTO food "
-                            "(food_id, food_name, serving, calories, calories_from_fat, "
-                            "cholesterol, dietary_fiber, protein, saturated_fat, sodium, "
-                            "sugar, total_carbs, total_fat, trans_fat, vitamin_d, vegetarian, "
-                            "vegan, balanced, description) VALUES "
-                            f'{foodValues}')
+    def insertFoodData(self, con):
+        rows = [tuple(getattr(food, column) for column in FOOD_COLUMNS) for food in self.newFoods]
+        self.insertRows(con, 'food', FOOD_COLUMNS, rows)
 
     # insert data into menu table
-    def insertMenuData(self):
-        if (len(self.newMenus) > 0):
-            menuValues = ""
-            for menuDict in self.newMenus:
-                menuValues += (f'({menuDict["menu_id"]}, "{menuDict["meal_type"]}", '
-                               f'"{menuDict["location"]}", "{menuDict["menu_date"]}"), \n')
-
-            menuValues = menuValues[:-3]
-            with engine.begin() as con:
-                con.execute("INSERT INTO menu "
-                            "(menu_id, meal_type, location, menu_date) VALUES "
-                            f'{menuValues}')
+    def insertMenuData(self, con):
+        self.insertRows(con, 'menu', ['menu_id', 'meal_type', 'location', 'menu_date'], self.newMenus)
 
     # insert data into food_on_menu table
-    def insertFoodMenuData(self):
-        if (len(self.newFoodMenuCombos) > 0):
-            foodMenuValues = ""
-            for foodMenuDict in self.newFoodMenuCombos:
-                foodMenuValues += (f'({foodMenuDict["menu_id"]}, {foodMenuDict["food_id"]}), \n')
-
-            foodMenuValues = foodMenuValues[:-3]
-            with engine.begin() as con:
-                con.execute("INSERT INTO food_on_menu "
-                            "(menu_id, food_id) VALUES "
-                            f'{foodMenuValues}')
+    def insertFoodMenuData(self, con):
+        self.insertRows(con, 'food_on_menu', ['menu_id', 'food_id'], self.newFoodMenuCombos, ignoreDuplicates=True)
 
     # insert data into allergen table
-    def insertAllergenData(self):
-        if (len(self.newAllergens) > 0):
-            allergenValues = ""
-            for allergenDict in self.newAllergens:
-                allergenValues += (f'({allergenDict["allergen_id"]}, "{allergenDict["allergen_name"]}"), \n')
-
-            allergenValues = allergenValues[:-3]
-            with engine.begin() as con:
-                con.execute("INSERT INTO allergen "
-                            "(allergen_id, allergen_name) VALUES "
-                            f'{allergenValues}')
+    def insertAllergenData(self, con):
+        self.insertRows(con, 'allergen', ['allergen_id', 'allergen_name'], self.newAllergens)
 
     # inserts data into food_on_allergen table
-    def insertFoodAllergenData(self):
-        if (len(self.newFoodAllergenCombos) > 0):
-            foodAllergenValues = ""
-            for foodAllergenDict in self.newFoodAllergenCombos:
-                foodAllergenValues += (f'({foodAllergenDict["food_id"]}, {foodAllergenDict["allergen_id"]}), \n')
-
-            foodAllergenValues = foodAllergenValues[:-3]
-            with engine.begin() as con:
-                con.execute("INSERT INTO food_on_allergen "
-                            "(food_id, allergen_id) VALUES "
-                            f'{foodAllergenValues}')
-
+    def insertFoodAllergenData(self, con):
+        self.insertRows(con, 'food_on_allergen', ['food_id', 'allergen_id'], self.newFoodAllergenCombos,
+                        ignoreDuplicates=True)
+
+    # records when the menus of each changed day were scraped, pages use it to tell browsers
+    # whether the copy they have is still current
+    def insertMenuVersionData(self, con):
+        scrapedAt = datetime.utcnow().replace(microsecond=0)
+        rows = [{'menu_date': menuDate, 'location': location, 'scraped_at': scrapedAt}
+                for location, menuDate in sorted(self.changedDays)]
+        if rows:
+            con.execute(text('insert into menu_version (menu_date, location, scraped_at) '
+                             'values (:menu_date, :location, :scraped_at) '
+                             'on duplicate key update scraped_at = values(scraped_at)'), rows)
+
+    # rebuilds the snapshots served by the menu pages for the changed days still within the retention,
+    # and drops the snapshots that fell out of it
+    def insertSnapshotData(self, con):
+        cutoff = datetime.now(timezone('US/Eastern')).date() - dt.timedelta(days=self.snapshotRetention)
+        build_snapshots(con, sorted(day for day in self.changedDays if day[1] >= cutoff))
+        compact_snapshots(con, cutoff)
+
+    # inserts all the new data in a single transaction so a failure leaves every table unchanged
     def insertAllData(self):
-        self.insertFoodData()
-        self.insertMenuData()
-        self.insertFoodMenuData()
-        self.insertAllergenData()
-        self.insertFoodAllergenData()
-
-    def scrapeAll(self, daysToGet):
-        EST = datetime.now(timezone('US/Eastern'))  # EST timezone
-        date = EST.strftime("%Y-%m-%d")
-        daysGotten = 0
-        while(daysGotten < daysToGet):
-            for location in self.locations:
-                self.getData(location, date)
-            EST += dt.timedelta(days=1)  # to increment day by one each time
-            date = EST.strftime("%Y-%m-%d")
-            daysGotten += 1
-        self.insertAllData()
-
-
-scraper = Scraper()
-
-# scrape any number of days
-numDaysToScrape = 7
-scraper.scrapeAll(numDaysToScrape)
+        start = time.perf_counter()
+        with begin() as con:
+            self.insertFoodData(con)
+            self.insertMenuData(con)
+            self.insertFoodMenuData(con)
+            self.insertAllergenData(con)
+            self.insertFoodAllergenData(con)
+            self.insertMenuVersionData(con)
+            self.insertSnapshotData(con)
+        # menus have changed so cached pages must be rebuilt
+        for menuDate in {menuDate for _, menuDate in self.changedDays}:
+            menu_cache.invalidate(menuDate.strftime("%Y-%m-%d"))
+        # the responses of this run do not need to be processed again until they change
+        for locationID, date in self.fetchedDays:
+            self.cache.markIngested(locationID, date)
+        self.fetchedDays = []
+        # everything new has been recorded
+        self.newFoods = []
+        self.newMenus = []
+        self.newFoodMenuCombos = []
+        self.newAllergens = []
+        self.newFoodAllergenCombos = []
+        self.changedDays = set()
+        self.timings['insert'] += time.perf_counter() - start
+
+    # scrapes the given locations for every date from start to end (inclusive)
+    # responses are downloaded to the cache first, then each day is parsed and diffed as soon as it is
+    # ready, in date order so IDs never collide, and only its items are held in memory
+    def scrapeRange(self, startDate, endDate, locations, workers=1, dryRun=False):
+        dates = [startDate + dt.timedelta(days=day) for day in range((endDate - startDate).days + 1)]
+        pairs = [(location, date.strftime("%Y-%m-%d")) for date in dates for location in locations]
+        start = time.perf_counter()
+        readers = Fetcher(**self.fetcherSettings).fetchAll([(LOCATION_IDS[location], date) for location, date in pairs])
+        self.timings['fetch'] += time.perf_counter() - start
+        for (location, date), (items, status, parseSeconds) in zip(pairs, parseDays(readers, workers)):
+            # parse times are summed over all the workers
+            self.timings['parse'] += parseSeconds
+            start = time.perf_counter()
+            self.processDay(location, date, items, status)
+            self.timings['diff'] += time.perf_counter() - start
+        if dryRun:
+            print(f"Dry run: would insert {len(self.newFoods)} foods, {len(self.newMenus)} menus, "
+                  f"{len(self.newFoodMenuCombos)} menu foods, {len(self.newAllergens)} allergens "
+                  f"and {len(self.newFoodAllergenCombos)} food allergens")
+        else:
+            self.insertAllData()
+
+    def printTimings(self):
+        print("Stage timings: " + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in self.timings.items()))
+
+
+def parseDate(value):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def main(argv=None):
+    today = datetime.now(timezone('US/Eastern')).date()  # EST timezone
+    parser = argparse.ArgumentParser(description='Scrapes the dining hall menus from dineoncampus into the database.')
+    parser.add_argument('--start', type=parseDate, default=today, help='first date to scrape as YYYY-MM-DD (default: today)')
+    parser.add_argument('--end', type=parseDate, help='last date to scrape as YYYY-MM-DD (default: 6 days after start)')
+    parser.add_argument('--locations', nargs='+', choices=list(LOCATION_IDS), default=list(LOCATION_IDS),
+                        help='locations to scrape (default: all)')
+    parser.add_argument('--workers', type=int, default=1, help='worker processes parsing days in parallel')
+    parser.add_argument('--dry-run', action='store_true', help='fetch and diff without writing to the database')
+    args = parser.parse_args(argv)
+    endDate = args.end if args.end is not None else args.start + dt.timedelta(days=6)
+    if endDate < args.start:
+        parser.error('--end must not be before --start')
+
+    # share the web app's pooled engine instead of opening a separate pool
+    app = create_app()
+    with app.app_context():
+        scraper = Scraper(app.config)
+        scraper.scrapeRange(args.start, endDate, args.locations, workers=args.workers, dryRun=args.dry_run)
+        scraper.printTimings()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+import os
+import sys
+
+# Serves recorded dineoncampus menu responses so the scraper can run without the real API.
+# Responses are read from <directory>/<location_id>_<date>.json, start the server with
+#   python scraping/stubServer.py <directory> [port]
+# and run the scraper with SCRAPER_API_URL=http://localhost:<port>/v1/location/menu
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # keep connections open like the real API
+    protocol_version = 'HTTP/1.1'
+    directory = '.'
+
+    def do_GET(self):
+        query = parse_qs(urlsplit(self.path).query)
+        locationID = query.get('location_id', [''])[0]
+        date = query.get('date', [''])[0]
+        path = os.path.join(self.directory, f'{locationID}_{date}.json')
+        if os.path.isfile(path):
+            with open(path, 'rb') as f:
+                body = f.read()
+        else:
+            # the API answers unknown days with a failed status rather than a 404
+            body = b'{"status": "error", "msg": "Menu not found"}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+if __name__ == '__main__':
+    StubHandler.directory = sys.argv[1] if len(sys.argv) > 1 else '.'
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8000
+    ThreadingHTTPServer(('localhost', port), StubHandler).serve_forever()
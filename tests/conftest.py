@@ -0,0 +1,13 @@
+import os
+import sys
+
+# dineinhall.config reads these when it is imported, the tests never reach a real database or mail server
+os.environ.setdefault('SECRET_KEY', 'test')
+os.environ.setdefault('SQLALCHEMY_DATABASE_URI', 'sqlite://')
+os.environ.setdefault('email_username', 'test@example.com')
+os.environ.setdefault('email_password', 'test')
+
+# the app package and the scraper are imported the way their scripts import them
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'scraping'))
@@ -0,0 +1,148 @@
+import json
+import os
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from jsonScraper import Fetcher, MenuReader, ResponseCache, SKIPPED, parseDay, parseDays
+from stubServer import StubHandler
+
+LOCATION_ID = 'loc'
+DATE = '2020-01-01'
+MENU = {'status': 'success',
+        'menu': {'periods': [{'name': 'Lunch', 'categories': [{'items': [
+            {'name': ' Pasta ', 'desc': None, 'portion': '1 cup', 'calories': '200',
+             'filters': [{'name': 'Vegetarian', 'type': 'label'}],
+             'nutrients': [{'name': 'Protein (g)', 'value': '7'}]}]}]}]}}
+
+
+# the stub server, answering with the queued statuses first and then like the real API
+class ScriptedHandler(StubHandler):
+    statuses = []
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(dict(self.headers))
+        if self.statuses:
+            status = self.statuses.pop(0)
+            body = b'{"error": "scripted"}'
+            self.send_response(status)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        super().do_GET()
+
+    def end_headers(self):
+        self.send_header('ETag', '"v1"')
+        super().end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(tmp_path):
+    served = tmp_path / 'served'
+    served.mkdir()
+    (served / f'{LOCATION_ID}_{DATE}.json').write_text(json.dumps(MENU))
+    ScriptedHandler.directory = str(served)
+    ScriptedHandler.statuses = []
+    ScriptedHandler.requests = []
+    httpd = ThreadingHTTPServer(('localhost', 0), ScriptedHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(str(tmp_path / 'cache'))
+
+
+def make_fetcher(server, cache, retries=2):
+    return Fetcher(f'http://localhost:{server.server_address[1]}/v1/location/menu', 'site',
+                   retries=retries, backoff=0, cache=cache)
+
+
+def test_success_is_cached_and_parsed(server, cache):
+    reader = make_fetcher(server, cache).fetch(LOCATION_ID, DATE)
+    assert isinstance(reader, MenuReader)
+    items, status = parseDay(reader)
+    assert status == 'success'
+    [(mealType, food, allergens)] = items
+    assert (mealType, food.food_name, food.protein, food.vegetarian) == ('Lunch', 'Pasta', 7, True)
+    assert cache.loadMeta(LOCATION_ID, DATE)['etag'] == '"v1"'
+
+
+def test_client_error_is_skipped_without_caching(server, cache):
+    ScriptedHandler.statuses = [404]
+    assert make_fetcher(server, cache).fetch(LOCATION_ID, DATE) is SKIPPED
+    assert cache.findBody(LOCATION_ID, DATE) is None
+    assert cache.loadMeta(LOCATION_ID, DATE) == {}
+    assert not any(name.endswith('.part') for name in os.listdir(cache.directory))
+    assert len(ScriptedHandler.requests) == 1
+
+
+@pytest.mark.parametrize('status', [429, 500, 503])
+def test_throttling_and_server_errors_are_retried(server, cache, status):
+    ScriptedHandler.statuses = [status, status]
+    reader = make_fetcher(server, cache).fetch(LOCATION_ID, DATE)
+    assert isinstance(reader, MenuReader)
+    assert len(ScriptedHandler.requests) == 3
+
+
+def test_gives_up_after_the_retries(server, cache):
+    ScriptedHandler.statuses = [500] * 3
+    assert make_fetcher(server, cache).fetch(LOCATION_ID, DATE) is SKIPPED
+    assert cache.findBody(LOCATION_ID, DATE) is None
+    assert not any(name.endswith('.part') for name in os.listdir(cache.directory))
+
+
+def test_a_failing_day_does_not_stop_the_others(server, cache):
+    ScriptedHandler.statuses = [503] * 3
+    fetcher = Fetcher(f'http://localhost:{server.server_address[1]}/v1/location/menu', 'site',
+                      concurrency=1, retries=2, backoff=0, cache=cache)
+    skipped, reader = fetcher.fetchAll([(LOCATION_ID, DATE), (LOCATION_ID, DATE)])
+    assert skipped is SKIPPED
+    assert isinstance(reader, MenuReader)
+
+
+def test_not_modified_reuses_the_cached_body(server, cache):
+    fetcher = make_fetcher(server, cache)
+    fetcher.fetch(LOCATION_ID, DATE)
+    ScriptedHandler.statuses = [304]
+    reader = fetcher.fetch(LOCATION_ID, DATE)
+    assert ScriptedHandler.requests[-1]['If-None-Match'] == '"v1"'
+    assert isinstance(reader, MenuReader)
+    # once ingested an unchanged day is not parsed again
+    cache.markIngested(LOCATION_ID, DATE)
+    ScriptedHandler.statuses = [304]
+    assert fetcher.fetch(LOCATION_ID, DATE) is None
+
+
+def test_validators_are_dropped_with_the_cached_body(server, cache):
+    fetcher = make_fetcher(server, cache)
+    fetcher.fetch(LOCATION_ID, DATE)
+    os.remove(cache.bodyPath(LOCATION_ID, DATE))
+    assert isinstance(fetcher.fetch(LOCATION_ID, DATE), MenuReader)
+    assert 'If-None-Match' not in ScriptedHandler.requests[-1]
+
+
+def test_failed_payloads_are_not_ingested(server, cache):
+    reader = make_fetcher(server, cache).fetch('unknown', DATE)
+    assert parseDay(reader) == ([], 'error')
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_days_without_a_menu_are_parsed_in_order(server, cache, workers):
+    fetcher = make_fetcher(server, cache)
+    ScriptedHandler.statuses = [404]
+    skipped = fetcher.fetch(LOCATION_ID, DATE)
+    reader = fetcher.fetch(LOCATION_ID, DATE)
+    results = list(parseDays([reader, skipped, None, reader], workers))
+    assert [status for _, status, _ in results] == ['success', SKIPPED, None, 'success']
+    assert [len(items) if items is not None else None for items, _, _ in results] == [1, None, None, 1]
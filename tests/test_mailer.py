@@ -0,0 +1,122 @@
+import json
+import socket
+
+import pytest
+from aiosmtpd.controller import Controller
+from flask import Flask
+from flask_mail import Mail, Message
+
+from dineinhall.mailer import MailQueue
+
+
+# keeps every message it accepts, turns away the first `failures` with a temporary error
+# and refuses recipients at bad.example.com for good
+class Recorder():
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.messages = []
+        self.refused = []
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.endswith('@bad.example.com'):
+            self.refused.append(address)
+            return '550 No such user'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.failures:
+            self.failures -= 1
+            return '451 Try again later'
+        self.messages.append(envelope)
+        return '250 OK'
+
+
+def unused_port():
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp():
+    recorder = Recorder()
+    port = unused_port()
+    controller = Controller(recorder, hostname='localhost', port=port)
+    controller.start()
+    yield recorder, port
+    controller.stop()
+
+
+def make_queue(tmp_path, port, retries=2):
+    app = Flask(__name__)
+    app.config.update(MAIL_SERVER='localhost', MAIL_PORT=port, MAIL_USE_TLS=False, MAIL_USE_SSL=False,
+                      MAIL_USERNAME=None, MAIL_PASSWORD=None, MAIL_DEFAULT_SENDER='noreply@example.com',
+                      MAIL_QUEUE_ENABLED=True, MAIL_QUEUE_WORKERS=2, MAIL_BATCH_SIZE=5, MAIL_RETRIES=retries,
+                      MAIL_BACKOFF=0, MAIL_IDLE_TIMEOUT=1,
+                      MAIL_DEAD_LETTER_PATH=str(tmp_path / 'dead_letter.jsonl'))
+    Mail(app)
+    return MailQueue(app)
+
+
+# messages take their default sender from the app the queue belongs to
+def reset_email(mail_queue, index, domain='example.com'):
+    with mail_queue.app.app_context():
+        return Message(f'Password Reset Request {index}', recipients=[f'user{index}@{domain}'],
+                       body=f'https://example.com/reset_password/secret-token-{index}')
+
+
+def test_delivers_every_queued_email(tmp_path, smtp):
+    recorder, port = smtp
+    mail_queue = make_queue(tmp_path, port)
+    for index in range(12):
+        mail_queue.send(reset_email(mail_queue, index))
+    mail_queue.flush()
+    assert sorted(envelope.rcpt_tos[0] for envelope in recorder.messages) == \
+        sorted(f'user{index}@example.com' for index in range(12))
+    assert not (tmp_path / 'dead_letter.jsonl').exists()
+
+
+def test_retries_temporary_failures(tmp_path, smtp):
+    recorder, port = smtp
+    recorder.failures = 2
+    mail_queue = make_queue(tmp_path, port)
+    mail_queue.send(reset_email(mail_queue, 0))
+    mail_queue.flush()
+    assert [envelope.rcpt_tos for envelope in recorder.messages] == [['user0@example.com']]
+
+
+def test_refused_recipients_do_not_hold_back_the_batch(tmp_path, smtp):
+    recorder, port = smtp
+    mail_queue = make_queue(tmp_path, port)
+    mail_queue.num_workers = 1
+    mail_queue.send(reset_email(mail_queue, 0, domain='bad.example.com'))
+    mail_queue.send(reset_email(mail_queue, 1))
+    mail_queue.send(reset_email(mail_queue, 2))
+    mail_queue.flush()
+    assert sorted(envelope.rcpt_tos[0] for envelope in recorder.messages) == ['user1@example.com',
+                                                                              'user2@example.com']
+    # a permanent refusal is not retried
+    assert recorder.refused == ['user0@bad.example.com']
+    [record] = [json.loads(line) for line in (tmp_path / 'dead_letter.jsonl').read_text().splitlines()]
+    assert record['recipients'] == ['user0@bad.example.com']
+
+
+def test_dead_letters_without_the_body(tmp_path):
+    mail_queue = make_queue(tmp_path, unused_port(), retries=1)
+    mail_queue.send(reset_email(mail_queue, 0))
+    mail_queue.flush()
+    [record] = [json.loads(line) for line in (tmp_path / 'dead_letter.jsonl').read_text().splitlines()]
+    assert record['subject'] == 'Password Reset Request 0'
+    assert record['recipients'] == ['user0@example.com']
+    assert 'secret-token' not in json.dumps(record)
+
+
+def test_workers_survive_unexpected_errors(tmp_path, smtp):
+    recorder, port = smtp
+    mail_queue = make_queue(tmp_path, port)
+    mail_queue.send(object())
+    mail_queue.flush()
+    mail_queue.send(reset_email(mail_queue, 1))
+    mail_queue.flush()
+    assert [envelope.rcpt_tos for envelope in recorder.messages] == [['user1@example.com']]